@@ -24,19 +24,82 @@
  ****
 """
 
-import sys, os
+import sys, os, argparse, time
+
+
+class StartupTrace:
+    """ wall time of the named startup phases, printed with --startup-trace """
+    def __init__(self):
+        self.last = time.perf_counter()
+        self.phases = []
+        self.enabled = "--startup-trace" in sys.argv
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        if self.enabled:
+            for name, seconds in self.phases:
+                print("%-16s %8.1f ms" % (name, seconds * 1000))
+            print("%-16s %8.1f ms" % ("time to frame", sum(s for _, s in self.phases) * 1000))
+        self.phases = []
+
+    def firstFrame(self, scene):
+        """ report after the first frame scene renders, for the modes
+        without a window whose swap would mark it """
+        def traced():
+            del scene.render
+            scene.render()
+            # nothing is swapped offscreen, wait for the frame to be done
+            glFinish()
+            self.mark("first frame")
+            self.report()
+        scene.render = traced
+
+trace = StartupTrace()
+
+# without an X display, a headless run needs an EGL context
+if "--headless" in sys.argv and not os.environ.get("DISPLAY"):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import OpenGL
+if "--fast" in sys.argv:
+    # production mode: no glGetError after every call and no call logging;
+    # only takes effect before OpenGL.GL is imported
+    OpenGL.ERROR_CHECKING = False
+    OpenGL.ERROR_LOGGING = False
 
 import glfw
-from OpenGL.GL import *
+# GLU and GLUT are not loaded at all. OpenGL.GL itself is still imported
+# whole (the largest import, ~120-150 ms): vbo.VBO only works once
+# OpenGL.GL has registered its buffer implementation, and any OpenGL.GL.*
+# submodule runs the package __init__ first
+from OpenGL.GL import glBufferSubData, glCallList, glClear, glClearColor, glColor3f, glDeleteLists, glDisable, \
+    glDisableClientState, glDrawArrays, glEnable, glEnableClientState, glEndList, glFinish, glFrustum, \
+    glGenLists, glLightfv, glLineWidth, glLoadIdentity, glLoadMatrixf, glMaterialfv, \
+    glMatrixMode, glMultMatrixf, glNewList, glNormalPointer, glOrtho, glPointSize, \
+    glPopMatrix, glPushMatrix, glRotate, glTranslate, glTranslatef, glVertexPointer, \
+    glViewport, GLfloat_3, GLfloat_4, \
+    GL_AMBIENT, GL_ARRAY_BUFFER, GL_COLOR_BUFFER_BIT, GL_COMPILE, GL_DEPTH_BUFFER_BIT, GL_DEPTH_TEST, GL_DIFFUSE, \
+    GL_FLOAT, GL_FOG, GL_FRONT, GL_LIGHT0, GL_LIGHT1, GL_LIGHTING, GL_MODELVIEW, \
+    GL_NORMALIZE, GL_NORMAL_ARRAY, GL_POSITION, GL_PROJECTION, GL_SHININESS, \
+    GL_SPECULAR, GL_TRIANGLES, GL_TRUE, GL_VERTEX_ARRAY
 from OpenGL.arrays import vbo
-from OpenGL.GLU import *
-from OpenGL.GLUT import *
 
 from enum import Enum
+import logging
 
 import numpy as np
 from numpy import array
-from functools import reduce
+
+import camera
+from loaders import load_model
+
+trace.mark("imports")
+
+log = logging.getLogger("viewer")
 
 
 class Scene:
@@ -47,6 +110,9 @@ class Scene:
         self.points = points
         self.normals = normals
         self.uni_vbo = vbo.VBO(array(data, "f"))
+        # upload now rather than on the first draw
+        self.uni_vbo.bind()
+        self.uni_vbo.unbind()
         self.vbo = vbo.VBO(array(self.points, "f"))
         self.vbon = vbo.VBO(array(self.normals, "f"))
         self.bbox = bbox
@@ -92,6 +158,25 @@ class Scene:
         self.neg_y = min([b[1] for b in self.bbox])
 
         self.color = [0.1, 0.5, 0.8, 1.0]
+
+        # silhouette/boundary outline, the edge index is built on first use
+        self.ortho = False
+        self.showOutline = False
+        self.edgeIndex = None
+        self.outline = None
+
+        # per-frame vertex streaming for deforming meshes
+        self.stream = None
+        self.animator = None
+
+        # fast path: static state and geometry recorded in a display list
+        self.fast = False
+        self.displayList = None
+        self.listState = None
+
+        # occlusion culled drawing of triangle clusters (--occlusion)
+        self.culler = None
+
         glPointSize(self.pointsize)
         glLineWidth(self.pointsize)
 
@@ -106,51 +191,165 @@ class Scene:
 
 
     def rotate(self, angle, axis):
-        angle *= 2
-        c, mc = np.cos(angle), 1 - np.cos(angle)
-        s = np.sin(angle)
-        l = np.sqrt(np.dot(axis, axis))
-        x, y, z = array(axis) / l
-        r = np.matrix(
-            [[x*x*mc+c, x*y*mc-z*s, x*z*mc+y*s, 0],
-             [x*y*mc+z*s, y*y*mc+c, y*z*mc-x*s, 0],
-             [x*z*mc-y*s, y*z*mc+x*s, z*z*mc+c, 0],
-             [0, 0, 0, 1]])
-        return r.T
+        return camera.rotation(angle, axis)
 
     def zoom(self, factor):
-        s = np.matrix(
-            [[factor, 0, 0, 0],
-             [0, factor, 0, 0],
-             [0, 0, factor, 0],
-             [0, 0, 0, 1]])
-        return s
+        return camera.scaling(factor)
 
     def translate(self, tX, tY):
-        t = np.matrix(
-            [[1, 0, 0, tX],
-             [0, 1, 0, tY],
-             [0, 0, 1, 0],
-             [0, 0, 0, 1]])
-        return t.T
+        return camera.translation(tX, tY)
+
+    def modelview(self):
+        """ the modelview matrix render() loads, for column vectors """
+        return camera.modelview(self)
+
+    def startStream(self, animator):
+        """ draw from a triple-buffered stream fed by animator.frame(t) """
+        from streaming import VertexStream
+        self.animator = animator
+        self.stream = VertexStream(len(self.points))
+        self.stream.update(animator.frame(0.))
+
+    def reload(self, points, normals, data):
+        """ replace the geometry, keeping the view; same vertex count updates
+        the changed ranges in place, anything else swaps in new buffers.
+        Returns the changed (start, stop) vertex ranges, or None for a swap. """
+        from hotreload import changed_ranges
+        data = np.ascontiguousarray(data, np.float32).reshape(len(points), -1)
+
+        if len(points) == len(self.points):
+            current = self.uni_vbo.data.reshape(len(self.points), -1)
+            ranges = changed_ranges(current, data)
+            if not ranges:
+                return ranges
+            stride = data.strides[0]
+            self.uni_vbo.bind()
+            for start, stop in ranges:
+                glBufferSubData(GL_ARRAY_BUFFER, start * stride, (stop - start) * stride, data[start:stop])
+                current[start:stop] = data[start:stop]
+            self.uni_vbo.unbind()
+        else:
+            ranges = None
+            # upload first, then switch over in one step
+            uni_vbo = vbo.VBO(data.reshape(-1, 3))
+            uni_vbo.bind()
+            uni_vbo.unbind()
+            self.uni_vbo, old = uni_vbo, self.uni_vbo
+            for buffer in (old, self.vbo, self.vbon):
+                buffer.delete()
+            self.vbo = vbo.VBO(array(points, "f"))
+            self.vbon = vbo.VBO(array(normals, "f"))
+
+        self.points = points
+        self.normals = normals
+        # the display list and the edge index hold the old geometry
+        if self.displayList is not None:
+            glDeleteLists(self.displayList, 1)
+            self.displayList = None
+        self.listState = None
+        self.edgeIndex = None
+        self.outline = None
+        if self.culler is not None:
+            from occlusion import OcclusionCuller
+            self.culler.delete()
+            self.culler = OcclusionCuller(points)
+        return ranges
+
+    def delete(self):
+        """ free the GL objects of this scene, the context stays """
+        for buffer in (self.uni_vbo, self.vbo, self.vbon):
+            buffer.delete()
+        if self.displayList is not None:
+            glDeleteLists(self.displayList, 1)
+            self.displayList = None
+        if self.stream is not None:
+            self.stream.delete()
+            self.stream = None
+        if self.culler is not None:
+            self.culler.delete()
+            self.culler = None
+        self.outline = None
+
+    def drawOutline(self):
+        if self.outline is None:
+            from halfedge import EdgeIndex, Outline
+            if self.edgeIndex is None:
+                self.edgeIndex = EdgeIndex.fromPoints(self.points)
+            self.outline = Outline(self.edgeIndex)
+        self.outline.draw(self.modelview(), self.ortho)
+
+    def compileList(self, state):
+        """ record everything render() does except the modelview setup """
+        if self.displayList is None:
+            self.displayList = glGenLists(1)
+        glNewList(self.displayList, GL_COMPILE)
+        glClearColor(*self.bgColor)
+        glMaterialfv(GL_FRONT, GL_DIFFUSE, self.color)
+        glMaterialfv(GL_FRONT, GL_SPECULAR, camera.MAT_SPECULAR)
+        glMaterialfv(GL_FRONT, GL_SHININESS, camera.MAT_SHININESS)
+
+        # client arrays are dereferenced while compiling, so the list holds
+        # the geometry itself
+        self.uni_vbo.bind()
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 24, self.uni_vbo)
+        glNormalPointer(GL_FLOAT, 24, self.uni_vbo + 12)
+
+        if self.doShadow:
+            glPushMatrix()
+            glTranslatef(0, self.neg_y, 0)
+            glTranslatef(self.xLight, self.yLight, self.zLight)
+            glMultMatrixf(self.shadow_p)
+            glTranslatef(-self.xLight, -self.yLight, -self.zLight)
+            glTranslatef(0, -self.neg_y, 0)
+            glColor3f(*self.shadowc)
+            glDisable(GL_DEPTH_TEST)
+            glDisable(GL_LIGHTING)
+            glDrawArrays(GL_TRIANGLES, 0, len(self.points))
+            glPopMatrix()
+            glEnable(GL_LIGHTING)
+            glEnable(GL_DEPTH_TEST)
+
+        glDrawArrays(GL_TRIANGLES, 0, len(self.points))
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glEndList()
+        self.uni_vbo.unbind()
+        self.listState = state
+
+    def renderFast(self):
+        """ two GL calls per frame: load the modelview, call the list """
+        state = (tuple(self.bgColor), tuple(self.color), self.doShadow)
+        if state != self.listState:
+            self.compileList(state)
+        glLoadMatrixf(np.ascontiguousarray(self.modelview().T, np.float32))
+        glCallList(self.displayList)
 
     # render 
     def render(self):
+        # streamed geometry and the outline change every frame
+        if self.fast and self.stream is None and not self.showOutline and self.culler is None:
+            return self.renderFast()
 
         glClearColor(*self.bgColor)
-        mat_specular = [0.8, 0.8, 0.8, 0.5]
-        mat_shininess = [8.0]
+        mat_specular = camera.MAT_SPECULAR
+        mat_shininess = camera.MAT_SHININESS
         glMaterialfv(GL_FRONT, GL_DIFFUSE, self.color)
         glMaterialfv(GL_FRONT, GL_SPECULAR, mat_specular)
         glMaterialfv(GL_FRONT, GL_SHININESS, mat_shininess)
 
         #self.vbo.bind()
-        self.uni_vbo.bind()
+        if self.stream is None:
+            self.uni_vbo.bind()
+            vertexPtr, normalPtr = self.uni_vbo, self.uni_vbo + 12
+        else:
+            vertexPtr, normalPtr = self.stream.bind()
 
         glEnableClientState(GL_NORMAL_ARRAY)
         glEnableClientState(GL_VERTEX_ARRAY)
 
-        glVertexPointer(3, GL_FLOAT, 24, self.uni_vbo)
+        glVertexPointer(3, GL_FLOAT, 24, vertexPtr)
 
         if self.doShadow:
             glMatrixMode(GL_MODELVIEW)
@@ -170,7 +369,7 @@ class Scene:
             glEnable(GL_LIGHTING)
             glEnable(GL_DEPTH_TEST)
 
-        glNormalPointer(GL_FLOAT, 24, self.uni_vbo+12)
+        glNormalPointer(GL_FLOAT, 24, normalPtr)
 
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
@@ -187,13 +386,23 @@ class Scene:
         #glScale(self.scale, self.scale, self.scale)
         glTranslate(-self.center[0], -self.center[1], -self.center[2])
 
-        glDrawArrays(GL_TRIANGLES, 0, len(self.points))
-        self.uni_vbo.unbind()
+        if self.culler is not None and self.stream is None:
+            self.culler.draw(self.uni_vbo, self.modelview(), self.ortho)
+        else:
+            glDrawArrays(GL_TRIANGLES, 0, len(self.points))
+        if self.stream is None:
+            self.uni_vbo.unbind()
+        else:
+            self.stream.unbind()
         #self.vbo.unbind()
 
         glDisableClientState(GL_VERTEX_ARRAY)
         glDisableClientState(GL_NORMAL_ARRAY)
 
+        # the outline is built from the static vertices, not the streamed ones
+        if self.showOutline and self.stream is None:
+            self.drawOutline()
+
 
 class ColorMode(Enum):
     background = 1
@@ -201,19 +410,16 @@ class ColorMode(Enum):
 
 class RenderWindow:
     """GLFW Rendering window class"""
-    def __init__(self, vertices, normals, data):
+    def __init__(self, vertices, normals, data, visible=True, size=(900, 900)):
 
-        glMatrixMode(GL_PROJECTION);
-        glLoadIdentity();
-        glMatrixMode(GL_MODELVIEW);
-        glLoadIdentity();
-        
         # save current working directory
         cwd = os.getcwd()
 
         # Initialize the library
-        if not glfw.init():
+        useGlfw = glfw.init()
+        if not useGlfw and visible:
             return
+        trace.mark("glfw init")
         
         # restore cwd
         os.chdir(cwd)
@@ -225,22 +431,39 @@ class RenderWindow:
         #glfw.WindowHint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
         
         # buffer hints
-        glfw.window_hint(glfw.DEPTH_BITS, 32)
+        if useGlfw:
+            glfw.window_hint(glfw.DEPTH_BITS, 32)
+
+            # hidden window for headless rendering
+            if not visible:
+                glfw.window_hint(glfw.VISIBLE, False)
 
         # define desired frame rate
         self.frame_rate = 100
 
         # make a window
-        self.width, self.height = 900, 900
+        self.width, self.height = size
         self.aspect = self.width/float(self.height)
-        self.window = glfw.create_window(self.width, self.height, "2D Graphics", None, None)
+        self.window = glfw.create_window(self.width, self.height, "2D Graphics", None, None) if useGlfw else None
         self.ortho = False
-        if not self.window:
+        self.egl = None
+        if not self.window and visible:
             glfw.terminate()
             return
 
         # Make the window's context current
-        glfw.make_context_current(self.window)
+        if self.window:
+            glfw.make_context_current(self.window)
+        else:
+            # no display at all, render offscreen through EGL
+            from headless import EGLContext
+            self.egl = EGLContext()
+        trace.mark("context")
+
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
 
         glMatrixMode(GL_PROJECTION)
 
@@ -258,13 +481,10 @@ class RenderWindow:
         glLightfv(GL_LIGHT1, GL_DIFFUSE, GLfloat_3(1., 1.0, 1.0))
         glLightfv(GL_LIGHT1, GL_POSITION, GLfloat_4(8, 1, 8, 0))
 
-        boundingBox = [list(map(min, zip(*vertices))), list(map(max, zip(*vertices)))]
-
         # create 3D
-        self.scene = Scene(self.width, self.height, vertices, normals, data, boundingBox)
-
-        self.scene.center = [(x[0] + x[1]) / 2 for x in zip(*boundingBox)]
-        self.scene.scale = 2. / max([x[1] - x[0] for x in zip(*boundingBox)])
+        self.scene = None
+        self.setModel(vertices, normals, data)
+        trace.mark("upload")
 
         # move object to origin
         #glMatrixMode(GL_MODELVIEW)
@@ -273,11 +493,12 @@ class RenderWindow:
         #glTranslate(-self.scene.center[0], -self.scene.center[1] - boundingBox[1][1], -self.scene.center[2])
 
         # set window callbacks
-        glfw.set_mouse_button_callback(self.window, self.onMouseButton)
-        glfw.set_key_callback(self.window, self.onKeyboard)
-        glfw.set_cursor_pos_callback(self.window, self.mouseMoved)
-        #glfw.set_scroll_callback(self.window, self.scrolled)
-        glfw.set_window_size_callback(self.window, self.onSize)
+        if self.window:
+            glfw.set_mouse_button_callback(self.window, self.onMouseButton)
+            glfw.set_key_callback(self.window, self.onKeyboard)
+            glfw.set_cursor_pos_callback(self.window, self.mouseMoved)
+            #glfw.set_scroll_callback(self.window, self.scrolled)
+            glfw.set_window_size_callback(self.window, self.onSize)
         
         # exit flag
         self.exitNow = False
@@ -285,13 +506,29 @@ class RenderWindow:
         # animation flag
         self.animation = True
 
+        # file watch mode (--watch)
+        self.watcher = None
+
+        # input recording (--record)
+        self.recorder = None
+
         self.colorMode = ColorMode.background
 
         self.prevX = -1
         self.prevY = -1
+        self.cursor = None
 
         glMatrixMode(GL_MODELVIEW)
 
+    def setModel(self, vertices, normals, data):
+        """ build the Scene for a model, freeing the buffers of the previous one """
+        if self.scene is not None:
+            self.scene.delete()
+        boundingBox = [list(np.min(vertices, axis=0)), list(np.max(vertices, axis=0))]
+        self.scene = Scene(self.width, self.height, vertices, normals, data, boundingBox)
+        self.scene.center = [(x[0] + x[1]) / 2 for x in zip(*boundingBox)]
+        self.scene.scale = 2. / max([x[1] - x[0] for x in zip(*boundingBox)])
+
     def setCamera(self):
 
         glMatrixMode(GL_PROJECTION)
@@ -301,24 +538,12 @@ class RenderWindow:
 
         glLoadIdentity()
 
-        aspect = float(self.width) / self.height
-
-        if aspect >= 1.0:
-            if self.ortho:
-                glOrtho(-1.5 * aspect, 1.5 * aspect,
-                        -1.5, 1.5,
-                        -100, 100)
-            else:
-                gluPerspective(45., aspect, 0.1, 100.)
-                glTranslatef(0., 0., -4.)
+        left, right, bottom, top, near, far = camera.frustum(self.width, self.height, self.ortho)
+        if self.ortho:
+            glOrtho(left, right, bottom, top, near, far)
         else:
-            if self.ortho:
-                glOrtho(-1.5, 1.5,
-                        -1.5 / aspect, 1.5 / aspect,
-                        -100, 100)
-            else:
-                gluPerspective(45. * float(self.height) / self.width, aspect, 0.1, 100.)
-                glTranslatef(0., 0., -4.)
+            glFrustum(left, right, bottom, top, near, far)
+            glTranslatef(0., 0., -camera.EYE_DISTANCE)
 
         glMatrixMode(GL_MODELVIEW)
 
@@ -329,7 +554,17 @@ class RenderWindow:
 
         return (x - fromRange[0]) * r + toRange[0]
 
+    def cursorPos(self, win):
+        """ last position seen by mouseMoved, so remote input works without a window """
+        if self.cursor is not None:
+            return self.cursor
+        if win is None:
+            # surfaceless EGL, nothing to ask before the first cursor event
+            return self.width / 2, self.height / 2
+        return glfw.get_cursor_pos(win)
+
     def mouseMoved(self, win, x, y):
+        self.cursor = (x, y)
 
         if self.scene.doRotation:
             r = min(self.width, self.height) / 2.0
@@ -348,7 +583,7 @@ class RenderWindow:
 
             if self.scene.scale <= 0.00015:
                 self.scene.scale = 0.0002
-            print(self.scene.scale)
+            log.debug("scale %s", self.scene.scale)
             self.prevY = y
             #self.scene.scale = self.mapToRange(delta, (deltaMin, deltaMax), (0., 2.))
 
@@ -361,7 +596,7 @@ class RenderWindow:
         self.prevX, self.prevY = x, y
 
     def scrolled(self, win, xoffset, yoffset):
-        print(yoffset)
+        log.debug("scrolled %s", yoffset)
         deltaMax, deltaMin = self.height, 0.
         self.scene.scaleFactor = self.mapToRange(yoffset, (deltaMin, deltaMax), (1., 4.))
         if yoffset == 0:
@@ -375,14 +610,14 @@ class RenderWindow:
         return x / l, y / l, z / l
 
     def onMouseButton(self, win, button, action, mods):
-        print("mouse button: ", win, button, action, mods)
+        log.debug("mouse button: %s %s %s %s", win, button, action, mods)
 
         # rotate on left mouse button
         if button == glfw.MOUSE_BUTTON_LEFT:
             r = min(self.width, self.height) / 2.0
             if action == glfw.PRESS:
                 self.scene.doRotation = True
-                x, y = glfw.get_cursor_pos(win)
+                x, y = self.cursorPos(win)
                 self.startP = self.projectOnSphere(x, y, r)
             if action == glfw.RELEASE:
                 self.scene.doRotation = False
@@ -391,10 +626,10 @@ class RenderWindow:
 
         # scale on middle mouse button
         if button == glfw.MOUSE_BUTTON_MIDDLE:
-            print("zoom")
+            log.debug("zoom")
             if action == glfw.PRESS:
                 self.scene.doZoom = True
-                self.startZoom = glfw.get_cursor_pos(win)
+                self.startZoom = self.cursorPos(win)
                 self.prevY = self.startZoom[1]
             if action == glfw.RELEASE:
                 self.scene.doZoom = False
@@ -405,14 +640,14 @@ class RenderWindow:
         if button == glfw.MOUSE_BUTTON_RIGHT:
             if action == glfw.PRESS:
                 self.scene.doTranslate = True
-                self.startPoint = glfw.get_cursor_pos(win)
+                self.startPoint = self.cursorPos(win)
             if action == glfw.RELEASE:
                 self.scene.doTranslate = False
                 self.scene.actPos = self.scene.actPos * self.scene.translate(*self.scene.offset)
                 self.scene.offset = (0, 0)
 
     def onKeyboard(self, win, key, scancode, action, mods):
-        print("keyboard: ", win, key, scancode, action, mods)
+        log.debug("keyboard: %s %s %s %s %s", win, key, scancode, action, mods)
         if action == glfw.PRESS:
             # ESC to quit
             if key == glfw.KEY_ESCAPE:
@@ -421,13 +656,11 @@ class RenderWindow:
                 # toggle animation
                 self.animation = not self.animation
             if key == glfw.KEY_O:
-                self.ortho = True
+                self.ortho = self.scene.ortho = True
                 self.setCamera()
-                self.run()
             if key == glfw.KEY_P:
-                self.ortho = False
+                self.ortho = self.scene.ortho = False
                 self.setCamera()
-                self.run()
             if key == glfw.KEY_C:
                 if self.colorMode == ColorMode.background:
                     self.colorMode = ColorMode.object
@@ -480,10 +713,15 @@ class RenderWindow:
                     self.scene.angle = 0
             if key == glfw.KEY_H:
                 self.scene.doShadow = not self.scene.doShadow
+            if key == glfw.KEY_E:
+                if self.scene.stream is not None:
+                    log.info("no outline during a vertex animation")
+                else:
+                    self.scene.showOutline = not self.scene.showOutline
 
 
     def onSize(self, win, width, height):
-        print("onsize: ", win, width, height)
+        log.debug("onsize: %s %s %s", win, width, height)
         if height == 0:
             height = 1
         self.width = self.scene.width = width
@@ -492,6 +730,43 @@ class RenderWindow:
         glViewport(0, 0, self.width, self.height)
         self.setCamera()
 
+    def handleEvent(self, message):
+        """ feed one recorded or remote input event to the GLFW handlers """
+        win = self.window
+        event = message["event"]
+        if event == "cursor":
+            self.mouseMoved(win, message["x"], message["y"])
+        elif event == "mouse_button":
+            if "x" in message:
+                self.cursor = (message["x"], message["y"])
+            self.onMouseButton(win, message["button"], message["action"], message.get("mods", 0))
+        elif event == "key":
+            self.onKeyboard(win, message["key"], message.get("scancode", 0),
+                            message["action"], message.get("mods", 0))
+        elif event == "size":
+            self.onSize(win, message["width"], message["height"])
+        else:
+            raise ValueError("unknown event %r" % event)
+
+    def checkReload(self):
+        """ apply a model the watcher finished parsing, True if the scene changed """
+        model = self.watcher.poll()
+        if model is None:
+            return False
+        start = time.perf_counter()
+        ranges = self.scene.reload(*model)
+        upload = time.perf_counter() - start
+        latency = time.perf_counter() - self.watcher.changed
+        if ranges is None:
+            detail = "new topology, buffers swapped (%d vertices)" % len(model[0])
+        else:
+            detail = "%d of %d vertices changed in %d ranges" % (
+                sum(stop - start for start, stop in ranges), len(model[0]), len(ranges))
+        print("reloaded %s in %.0f ms (parse %.0f ms, upload %.2f ms): %s"
+              % (os.path.basename(self.watcher.filename), latency * 1000,
+                 self.watcher.parseTime * 1000, upload * 1000, detail))
+        return True
+
     def run(self):
 
         glfw.set_input_mode(self.window,glfw.STICKY_KEYS,GL_TRUE)
@@ -503,120 +778,179 @@ class RenderWindow:
                 # update time
                 t = currT
 
+                # stream the next frame of a vertex animation
+                if self.animation and self.scene.stream is not None:
+                    self.scene.stream.update(self.scene.animator.frame(currT))
+
+                if self.watcher is not None:
+                    self.checkReload()
+
                 # clear
                 glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
                 self.scene.render()
 
                 glfw.swap_buffers(self.window)
+                if self.recorder is not None:
+                    self.recorder.frame()
+                if trace.phases:
+                    trace.mark("first frame")
+                    trace.report()
                 # Poll for and process events
                 glfw.poll_events()
         # end
         glfw.terminate()
 
-def normalize(x):
-    return x / np.linalg.norm(x)
-
-
-def calcNormals(x, y, z):
-
-    xy = normalize(y) - normalize(x)
-    xz = normalize(z) - normalize(x)
-
-    n = np.cross(xy, xz)
-
-    return n
-
-
-
-def read_file(filename):
-    vertices = []
-    normals = []
-    textures = []
-    points = []
-    nls = []
-    data = []
-    vertex_normals = {}
-    faces = []
-
-    with open(filename) as file:
-        for line in file:
-            if line.startswith("vn"):
-                x,y,z = line.strip("vn ").split()
-                normals.append(np.array([x,y,z]).astype(float))
-                continue
-            if line.startswith("vt"):
-                x,y = line.strip("vt ").split()
-                textures.append(np.array([x,y,z]).astype(float))
-                continue
-            if line.startswith("v"):
-                x,y,z = line.strip("v ").split()
-                vertices.append(np.array([x,y,z]).astype(float))
-                continue
-            if line.startswith("f"):
-                # f v/vt/vn v/vt/vn v/vt/vn
-                x,y,z = line.strip("f ").split()
-                if len(x.split("/")) == 1:
-                    x = np.array([int(x),0,0])
-                    y = np.array([int(y),0,0])
-                    z = np.array([int(z),0,0])
-                else:
-                    x = np.array([int(x) if x else 0 for x in line.strip("f ").split()[0].split("/")])
-                    y = np.array([int(x) if x else 0 for x in line.strip("f ").split()[1].split("/")])
-                    z = np.array([int(x) if x else 0 for x in line.strip("f ").split()[2].split("/")])
-
-                if x[2] != 0: # normals are given
-
-                    vertex_normals[x[0]] = normals[x[2] - 1]
-                    vertex_normals[y[0]] = normals[y[2] - 1]
-                    vertex_normals[z[0]] = normals[z[2] - 1]
-
-                else:
-
-                    # calc normal for face
-                    n = calcNormals(np.array(vertices[x[0] - 1]), np.array(vertices[y[0] - 1]), np.array(vertices[z[0] - 1]))
-
-                    # if there already is a normal for a vertex, just add n to the existing normal
-                    if vertex_normals.get(x[0], np.array(0)).any():
-                        vertex_normals[x[0]] += normalize(n)
-                    else:
-                        vertex_normals[x[0]] = normalize(n)
-
-                    if vertex_normals.get(y[0], np.array(0)).any():
-                        vertex_normals[y[0]] += normalize(n)
-                    else:
-                        vertex_normals[y[0]] = normalize(n)
-
-                    if vertex_normals.get(z[0], np.array(0)).any():
-                        vertex_normals[z[0]] += normalize(n)
-                    else:
-                        vertex_normals[z[0]] = normalize(n)
-
-                faces.append([x, y, z])
-                continue
-
-
-    for face in faces:
-        for vertex in face:
-            data.append(vertices[vertex[0] - 1])
-            points.append(vertices[vertex[0] - 1])
-            data.append(vertex_normals[vertex[0]])
-            nls.append(vertex_normals[vertex[0]])
-
-    return points, nls, data
-
 # main() function
 def main():
     print("Modelviewer")
 
-    if len(sys.argv) != 2:
-        print(os.path.basename(__file__), "objectPoints")
-        sys.exit()
+    if sys.argv[1:2] == ["batch"]:
+        import batch
+        return batch.main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__))
+    parser.add_argument("model", help="object file (.obj, .ply, .stl or cached .npz)")
+    parser.add_argument("--headless", action="store_true", help="render without a visible window")
+    parser.add_argument("--startup-trace", action="store_true", help="print startup phase times")
+    parser.add_argument("--fast", action="store_true",
+                        help="production mode: no GL error checking, static state in a display list")
+    parser.add_argument("--gl-stats", type=int, metavar="N",
+                        help="render N frames with each render path and report GL calls and Python time")
+    parser.add_argument("--log-level", default="WARNING", help="e.g. DEBUG to print every input event")
+    parser.add_argument("--export", type=int, metavar="N", help="export N frames instead of viewing")
+    parser.add_argument("--out", default="frames", help="directory for exported frames")
+    parser.add_argument("--path", help="camera path file (yaw pitch zoom panX panY per line)")
+    parser.add_argument("--workers", type=int, help="number of PNG encoder threads")
+    parser.add_argument("--sequence", nargs="+", metavar="FILE",
+                        help="further frames of a vertex animation (same vertex count as model)")
+    parser.add_argument("--wave", action="store_true", help="animate the model with a synthetic wave")
+    parser.add_argument("--stream-bench", type=int, metavar="N",
+                        help="stream N animation frames as fast as possible and report vertices/s")
+    parser.add_argument("--watch", action="store_true",
+                        help="reload the model in place whenever the file changes")
+    parser.add_argument("--occlusion", action="store_true",
+                        help="skip triangle clusters hidden behind others (occlusion queries)")
+    parser.add_argument("--occlusion-bench", type=int, metavar="N",
+                        help="render an N frame turntable with and without occlusion culling")
+    parser.add_argument("--poster", metavar="FILE", help="render one large still to FILE in tiles")
+    parser.add_argument("--poster-size", default="16384", metavar="WxH",
+                        help="poster size in pixels, e.g. 16384 or 16384x9216")
+    parser.add_argument("--supersample", type=int, default=1, metavar="N",
+                        help="render the poster at N times the size and downsample")
+    parser.add_argument("--tile", type=int, default=2048, help="poster tile size, at most the largest FBO")
+    parser.add_argument("--record", metavar="FILE", help="log every input event and frame to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="play back an input recording and report frame times")
+    parser.add_argument("--replay-speed", type=float, default=0., metavar="X",
+                        help="1 replays at the recorded timing, 0 (default) as fast as possible")
+    parser.add_argument("--trace", metavar="FILE", help="write the frame times of --replay as JSON")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="render offscreen and stream frames to clients on a local TCP port")
+    parser.add_argument("--jpeg", action="store_true", help="stream JPEG instead of PNG frames (needs Pillow)")
+    parser.add_argument("--bench-client", type=int, metavar="N",
+                        help="with --serve: drag with N cursor events from a local client, report latency and fps")
+    args = parser.parse_args()
+    if args.watch and (args.sequence or args.wave):
+        parser.error("--watch does not work with a vertex animation")
+    if args.occlusion and (args.gl_stats or args.occlusion_bench):
+        parser.error("--occlusion does not combine with --gl-stats or --occlusion-bench")
+    if args.occlusion and (args.sequence or args.wave or args.stream_bench):
+        parser.error("--occlusion does not work with a vertex animation")
+    if args.record and args.headless:
+        parser.error("--record needs a window")
+    if args.supersample < 1:
+        parser.error("--supersample must be at least 1")
+    if args.tile < args.supersample:
+        parser.error("--tile must be at least --supersample")
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+
+    model = load_model(args.model)
+    trace.mark("parse")
+
+    rw = RenderWindow(*model, visible=not args.headless)
+    rw.scene.fast = args.fast
+    if args.occlusion:
+        # before any mode runs, so every render path below is culled
+        from occlusion import OcclusionCuller
+        rw.scene.culler = OcclusionCuller(rw.scene.points)
+    if trace.enabled and (args.gl_stats or args.stream_bench or args.export or args.occlusion_bench or
+                          args.poster or args.replay or args.serve):
+        trace.firstFrame(rw.scene)
+
+    if args.gl_stats:
+        import glstats
+        glstats.report(rw, args.gl_stats)
+        glfw.terminate()
+        return
+
+    # batch caches carry the edge index along with the mesh
+    if args.model.lower().endswith(".npz"):
+        from halfedge import EdgeIndex
+        with np.load(args.model) as cache:
+            rw.scene.edgeIndex = EdgeIndex.fromCache(cache)
+
+    if args.sequence or args.wave or args.stream_bench:
+        import streaming
+        if args.sequence:
+            frames = [rw.scene.uni_vbo.data]
+            for filename in args.sequence:
+                points, _, data = load_model(filename)
+                if len(points) != len(rw.scene.points):
+                    parser.error("--sequence: %s has %d vertices, %s has %d"
+                                 % (filename, len(points), args.model, len(rw.scene.points)))
+                frames.append(data)
+            animator = streaming.MorphAnimation(frames)
+        else:
+            animator = streaming.WaveAnimation(rw.scene.points, rw.scene.normals)
+        rw.scene.startStream(animator)
+        if args.stream_bench:
+            streaming.benchmark(rw, animator, args.stream_bench)
+            glfw.terminate()
+            return
 
+    if args.export:
+        from export import export_frames
+        export_frames(rw, args.export, args.out, path=args.path, workers=args.workers)
+        glfw.terminate()
+        return
 
+    if args.occlusion_bench:
+        import occlusion
+        occlusion.benchmark(rw, args.occlusion_bench)
+        glfw.terminate()
+        return
 
-    rw = RenderWindow(*read_file(sys.argv[1]))
-    rw.run()
+    if args.poster:
+        from poster import render_poster
+        size = [int(v) for v in args.poster_size.lower().split("x")]
+        width, height = size * 2 if len(size) == 1 else size
+        render_poster(rw, args.poster, width, height, args.supersample, args.tile)
+        glfw.terminate()
+        return
+
+    if args.replay:
+        import inputlog
+        inputlog.replay(rw, args.replay, args.replay_speed, args.trace)
+        glfw.terminate()
+        return
+
+    if args.watch:
+        from hotreload import ModelWatcher
+        rw.watcher = ModelWatcher(args.model)
+
+    if args.serve:
+        import server
+        server.main(rw, args.serve, "jpeg" if args.jpeg else "png", args.bench_client)
+        glfw.terminate()
+    else:
+        if args.record:
+            from inputlog import Recorder
+            rw.recorder = Recorder(rw, args.record)
+        rw.run()
+        if rw.recorder is not None:
+            rw.recorder.close()
+    if rw.watcher is not None:
+        rw.watcher.close()
 
 
 # call main
@@ -0,0 +1,170 @@
+"""
+/**         batch.py
+ *
+ *          Batch preprocessing of model directories: every model is parsed,
+ *          indexed and cached as .npz together with its edge index, and a
+ *          thumbnail is rendered offscreen. Files run on a process pool;
+ *          each worker opens one hidden GL context and reuses it for all
+ *          of its models. Models whose cache
+ *          is up to date are skipped, so an interrupted run can simply be
+ *          restarted.
+ *
+ *          python3 RenderWindow.py batch models/ --out cache/ --headless
+ ****
+"""
+
+import os, sys, time, atexit, argparse, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+EXTENSIONS = (".obj", ".ply", ".stl")
+
+
+def find_models(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+# per worker process: one hidden GL context and FBO, reused for every model
+window = None
+target = None
+
+
+def init_worker(headless):
+    """ ProcessPoolExecutor initializer """
+    # without an X display the context has to come from EGL, which must be
+    # chosen before OpenGL is first imported
+    if headless and not os.environ.get("DISPLAY"):
+        os.environ["PYOPENGL_PLATFORM"] = "egl"
+    atexit.register(close_worker)
+
+
+def close_worker():
+    if window is None:
+        return
+    import glfw
+    if target is not None:
+        target.delete()
+    window.scene.delete()
+    if window.egl is not None:
+        window.egl.destroy()
+    glfw.terminate()
+
+
+def render_thumbnail(filename, points, normals, data, size):
+    """ render one frame into the FBO of the worker's hidden context and write it as PNG """
+    global window, target
+    from OpenGL.GL import glClear, glClearColor, glReadPixels, glPixelStorei, \
+        GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, GL_PACK_ALIGNMENT, GL_RGB, GL_UNSIGNED_BYTE
+    from RenderWindow import RenderWindow
+    from export import Offscreen
+    from pngwriter import write_png
+
+    if window is None:
+        window = RenderWindow(points, normals, data, visible=False, size=(size, size))
+    else:
+        window.setModel(points, normals, data)
+        if (window.width, window.height) != (size, size):
+            window.onSize(window.window, size, size)
+    if target is None or (target.width, target.height) != (size, size):
+        if target is not None:
+            target.delete()
+        target = Offscreen(size, size)
+    target.bind()
+    window.setCamera()
+    glClearColor(*window.scene.bgColor)
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    window.scene.render()
+    glPixelStorei(GL_PACK_ALIGNMENT, 1)
+    pixels = glReadPixels(0, 0, size, size, GL_RGB, GL_UNSIGNED_BYTE)
+    pixels = np.frombuffer(pixels, np.uint8).reshape(size, size, 3)[::-1]
+    target.unbind()
+    write_png(filename, pixels)
+
+
+def render_thumbnail_software(filename, points, normals, size):
+    """ thumbnail for machines that cannot create a GL context """
+    import camera, softraster
+    from pngwriter import write_png
+
+    image, _ = softraster.render(points, normals, camera.View.fit(points), size, size, workers=1)
+    write_png(filename, image)
+
+
+def process(source, cacheFile, thumbFile, thumbSize, software=False):
+    """ parse -> normals -> optimize -> cache (-> thumbnail) for one model """
+    from loaders import load_model, optimize, write_cache
+    from halfedge import EdgeIndex
+
+    start = time.perf_counter()
+    # the loaders compute normals where the file has none
+    points, normals, data = load_model(source)
+    vertices, vnormals, faces = optimize(points, normals)
+    edges = EdgeIndex.fromPoints(points)
+    os.makedirs(os.path.dirname(cacheFile) or ".", exist_ok=True)
+    write_cache(cacheFile, source, vertices, vnormals, faces, **edges.arrays())
+    if thumbFile and software:
+        render_thumbnail_software(thumbFile, points, normals, thumbSize)
+    elif thumbFile:
+        render_thumbnail(thumbFile, points, normals, data, thumbSize)
+    return len(faces), time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="RenderWindow.py batch")
+    parser.add_argument("directory", help="directory searched recursively for models")
+    parser.add_argument("--out", default="cache", help="directory for caches and thumbnails")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--thumbnail", type=int, default=256, metavar="SIZE",
+                        help="thumbnail size in pixels, 0 disables thumbnails")
+    parser.add_argument("--force", action="store_true", help="rebuild up to date caches")
+    parser.add_argument("--headless", action="store_true", help="render thumbnails without a display")
+    parser.add_argument("--software", action="store_true",
+                        help="render thumbnails with the NumPy rasterizer instead of GL")
+    args = parser.parse_args(argv)
+
+    from loaders import cache_is_current
+
+    jobs = []
+    skipped = 0
+    for source in find_models(args.directory):
+        base = os.path.join(args.out, os.path.relpath(source, args.directory))
+        cacheFile = base + ".npz"
+        thumbFile = base + ".png" if args.thumbnail else None
+        current = cache_is_current(cacheFile, source) and (not thumbFile or os.path.exists(thumbFile))
+        if current and not args.force:
+            skipped += 1
+            continue
+        jobs.append((source, cacheFile, thumbFile, args.thumbnail, args.software))
+
+    print("%d models to process, %d up to date" % (len(jobs), skipped))
+    if not jobs:
+        return
+
+    # spawn, so no worker inherits GL state from the parent
+    context = multiprocessing.get_context("spawn")
+    failed = 0
+    triangles = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs, mp_context=context, initializer=init_worker,
+                             initargs=(args.headless,)) as pool:
+        futures = {pool.submit(process, *job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                count, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print("FAILED %s: %s" % (source, e), file=sys.stderr)
+                continue
+            triangles += count
+            print("%-50s %9d triangles %7.2fs %12.0f tris/s" % (source, count, seconds, count / seconds))
+    elapsed = time.perf_counter() - start
+
+    done = len(jobs) - failed
+    print("%d models (%d triangles) in %.2fs: %.2f files/s, %.0f tris/s, %d failed"
+          % (done, triangles, elapsed, done / elapsed, triangles / elapsed, failed))
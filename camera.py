@@ -0,0 +1,134 @@
+"""
+/**         camera.py
+ *
+ *          Projection, view and material parameters of RenderWindow.setCamera
+ *          and Scene.render, kept free of GL so they can be shared by code
+ *          that runs without a context.
+ ****
+"""
+
+import math
+
+import numpy as np
+
+NEAR, FAR = 0.1, 100.
+# the perspective camera looks at the origin from this distance
+EYE_DISTANCE = 4.
+
+# material of Scene.render, the diffuse color is Scene.color
+MAT_SPECULAR = [0.8, 0.8, 0.8, 0.5]
+MAT_SHININESS = [8.0]
+
+
+def frustum(width, height, ortho):
+    """ (left, right, bottom, top, near, far) for glOrtho or glFrustum """
+    aspect = float(width) / height
+    if ortho:
+        if aspect >= 1.0:
+            return -1.5 * aspect, 1.5 * aspect, -1.5, 1.5, -100., 100.
+        return -1.5, 1.5, -1.5 / aspect, 1.5 / aspect, -100., 100.
+
+    # same field of view as gluPerspective(45., aspect, ...) used before,
+    # portrait windows keep the horizontal angle
+    fovy = 45. if aspect >= 1.0 else 45. * height / width
+    top = NEAR * math.tan(math.radians(fovy) / 2)
+    return -top * aspect, top * aspect, -top, top, NEAR, FAR
+
+
+def tile_frustum(bounds, width, height, x, y, size):
+    """ bounds of the size x size pixel tile at (x, y) (from the top left) of
+    a width x height image with frustum bounds, so the tiles fit together """
+    left, right, bottom, top, near, far = bounds
+    sx = (right - left) / width
+    sy = (top - bottom) / height
+    return left + x * sx, left + (x + size) * sx, top - (y + size) * sy, top - y * sy, near, far
+
+
+def frustum_matrix(left, right, bottom, top, near, far):
+    """ glFrustum as a matrix for column vectors """
+    return np.array([
+        [2 * near / (right - left), 0, (right + left) / (right - left), 0],
+        [0, 2 * near / (top - bottom), (top + bottom) / (top - bottom), 0],
+        [0, 0, -(far + near) / (far - near), -2 * far * near / (far - near)],
+        [0, 0, -1, 0]])
+
+
+def ortho_matrix(left, right, bottom, top, near, far):
+    """ glOrtho as a matrix for column vectors """
+    return np.array([
+        [2 / (right - left), 0, 0, -(right + left) / (right - left)],
+        [0, 2 / (top - bottom), 0, -(top + bottom) / (top - bottom)],
+        [0, 0, -2 / (far - near), -(far + near) / (far - near)],
+        [0, 0, 0, 1]])
+
+
+def projection(width, height, ortho):
+    """ the projection matrix setCamera loads """
+    bounds = frustum(width, height, ortho)
+    if ortho:
+        return ortho_matrix(*bounds)
+    eye = np.identity(4)
+    eye[2, 3] = -EYE_DISTANCE
+    return frustum_matrix(*bounds) @ eye
+
+
+# arcball, zoom and pan matrices; like glMultMatrixf they are stored
+# transposed, so products are read right to left
+def rotation(angle, axis):
+    angle *= 2
+    c, mc = np.cos(angle), 1 - np.cos(angle)
+    s = np.sin(angle)
+    l = np.sqrt(np.dot(axis, axis))
+    x, y, z = np.array(axis) / l
+    r = np.matrix(
+        [[x*x*mc+c, x*y*mc-z*s, x*z*mc+y*s, 0],
+         [x*y*mc+z*s, y*y*mc+c, y*z*mc-x*s, 0],
+         [x*z*mc-y*s, y*z*mc+x*s, z*z*mc+c, 0],
+         [0, 0, 0, 1]])
+    return r.T
+
+
+def scaling(factor):
+    return np.matrix(
+        [[factor, 0, 0, 0],
+         [0, factor, 0, 0],
+         [0, 0, factor, 0],
+         [0, 0, 0, 1]])
+
+
+def translation(tX, tY):
+    t = np.matrix(
+        [[1, 0, 0, tX],
+         [0, 1, 0, tY],
+         [0, 0, 1, 0],
+         [0, 0, 0, 1]])
+    return t.T
+
+
+def modelview(view):
+    """ the modelview matrix Scene.render loads, for column vectors """
+    m = ((view.actPos * translation(*view.offset)).T *
+         (view.actSize * scaling(view.scale)).T *
+         (view.actOri * rotation(view.angle, view.axis)).T)
+    t = np.identity(4)
+    t[:3, 3] = np.negative(view.center)
+    return np.asarray(m) @ t
+
+
+class View:
+    """ the view state of a Scene, for code that runs without one """
+    def __init__(self, center, scale):
+        self.center = center
+        self.scale = scale
+        self.angle = 0
+        self.axis = np.array([0, 1, 0])
+        self.offset = (0, 0)
+        self.actOri = np.identity(4)
+        self.actSize = np.identity(4)
+        self.actPos = np.identity(4)
+
+    @classmethod
+    def fit(cls, points):
+        """ centered and scaled to the bounding box like RenderWindow does """
+        lo, hi = np.min(points, axis=0), np.max(points, axis=0)
+        return cls(list((lo + hi) / 2), 2. / max(hi - lo))
@@ -0,0 +1,195 @@
+"""
+/**         export.py
+ *
+ *          Offscreen frame export for the model viewer: renders a turntable
+ *          or a scripted camera path into a framebuffer object, reads the
+ *          pixels back through a ring of pixel buffer objects and encodes
+ *          the frames to PNG on a thread pool.
+ ****
+"""
+
+import os, time, ctypes
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenGL.GL import glBindBuffer, glBindFramebuffer, glBindRenderbuffer, glBufferData, \
+    glCheckFramebufferStatus, glClear, glClearColor, glDeleteBuffers, glDeleteFramebuffers, \
+    glDeleteRenderbuffers, glFramebufferRenderbuffer, glGenBuffers, glGenFramebuffers, \
+    glGenRenderbuffers, glMapBuffer, glPixelStorei, glReadPixels, glRenderbufferStorage, \
+    glUnmapBuffer, glViewport, GL_COLOR_ATTACHMENT0, GL_COLOR_BUFFER_BIT, \
+    GL_DEPTH_ATTACHMENT, GL_DEPTH_BUFFER_BIT, GL_DEPTH_COMPONENT24, GL_FRAMEBUFFER, \
+    GL_FRAMEBUFFER_COMPLETE, GL_PACK_ALIGNMENT, GL_PIXEL_PACK_BUFFER, GL_READ_ONLY, \
+    GL_RENDERBUFFER, GL_RGBA, GL_RGBA8, GL_STREAM_READ, GL_UNSIGNED_BYTE
+
+import numpy as np
+
+from pngwriter import write_png
+
+
+class Offscreen:
+    """ framebuffer object with color and depth renderbuffers """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        self.color, self.depth = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.delete()
+            raise RuntimeError("incomplete framebuffer: 0x%x" % status)
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+
+    def unbind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def delete(self):
+        glDeleteFramebuffers(1, [self.fbo])
+        glDeleteRenderbuffers(2, [self.color, self.depth])
+
+
+class PixelReader:
+    """ asynchronous glReadPixels through a ring of pixel buffer objects
+
+    read() only queues a transfer into the next PBO; the oldest PBO is mapped
+    once the ring is full, by which time its transfer has long completed, so
+    the pipeline never stalls on a readback.
+    """
+    def __init__(self, width, height, count=3):
+        self.width = width
+        self.height = height
+        self.size = width * height * 4
+        self.pbos = [int(p) for p in np.atleast_1d(glGenBuffers(count))]
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.index = 0
+        self.pending = deque()
+
+    def read(self, tag):
+        """ queue a readback of the bound framebuffer, return finished frames """
+        done = []
+        if len(self.pending) == len(self.pbos):
+            done.append(self.fetch())
+
+        pbo = self.pbos[self.index]
+        self.index = (self.index + 1) % len(self.pbos)
+        glPixelStorei(GL_PACK_ALIGNMENT, 4)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.pending.append((tag, pbo))
+        return done
+
+    def flush(self):
+        """ fetch all frames still in flight """
+        return [self.fetch() for _ in range(len(self.pending))]
+
+    def fetch(self):
+        tag, pbo = self.pending.popleft()
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        ptr = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        ptr = getattr(ptr, "value", ptr)
+        buf = (ctypes.c_ubyte * self.size).from_address(ptr)
+        pixels = np.frombuffer(buf, np.uint8).reshape(self.height, self.width, 4).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        # GL rows start at the bottom
+        return tag, pixels[::-1, :, :3]
+
+    def delete(self):
+        glDeleteBuffers(len(self.pbos), self.pbos)
+
+
+def load_path(filename):
+    """ camera keyframes, one per line: yaw pitch zoom panX panY (degrees) """
+    keys = np.loadtxt(filename, ndmin=2)
+    if keys.shape[1] != 5:
+        raise ValueError("%s: expected 5 values per keyframe" % filename)
+    return keys
+
+
+def interpolate(keys, t):
+    """ linear interpolation of keyframes for t in [0, 1] """
+    if len(keys) == 1:
+        return keys[0]
+    s = t * (len(keys) - 1)
+    i = min(int(s), len(keys) - 2)
+    f = s - i
+    return keys[i] * (1 - f) + keys[i + 1] * f
+
+
+def export_frames(window, count, directory, path=None, workers=None, ring=3):
+    """ render count frames of a turntable (or camera path) to directory """
+    scene = window.scene
+    os.makedirs(directory, exist_ok=True)
+
+    keys = load_path(path) if path else None
+    baseOri, baseSize, basePos = scene.actOri, scene.actSize, scene.actPos
+
+    target = Offscreen(window.width, window.height)
+    reader = PixelReader(window.width, window.height, ring)
+    target.bind()
+    # render() only sets the clear color for the next frame
+    glClearColor(*scene.bgColor)
+
+    def encode(i, pixels):
+        write_png(os.path.join(directory, "frame_%05d.png" % i), pixels)
+
+    # encodes in flight; more would pile up read back frames in memory
+    # whenever encoding is slower than rendering
+    limit = 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+
+    def submit(tag, pixels):
+        if len(pending) >= limit:
+            pending.popleft().result()
+        pending.append(pool.submit(encode, tag, pixels))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for i in range(count):
+            if keys is None:
+                # full turn around the y axis through scene.center
+                scene.actOri = baseOri * scene.rotate(np.pi * i / count, [0, 1, 0])
+            else:
+                yaw, pitch, zoom, panX, panY = interpolate(keys, i / max(count - 1, 1))
+                # rotate() doubles the angle (arcball convention)
+                scene.actOri = (baseOri * scene.rotate(np.radians(yaw) / 2, [0, 1, 0])
+                                * scene.rotate(np.radians(pitch) / 2, [1, 0, 0]))
+                scene.actSize = baseSize * scene.zoom(zoom)
+                scene.actPos = basePos * scene.translate(panX, panY)
+
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            scene.render()
+
+            for tag, pixels in reader.read(i):
+                submit(tag, pixels)
+        for tag, pixels in reader.flush():
+            submit(tag, pixels)
+        while pending:
+            pending.popleft().result()
+    elapsed = time.perf_counter() - start
+
+    target.unbind()
+    reader.delete()
+    target.delete()
+    glViewport(0, 0, window.width, window.height)
+    scene.actOri, scene.actSize, scene.actPos = baseOri, baseSize, basePos
+
+    print("exported %d frames to %s in %.2fs (%.1f fps)" % (count, directory, elapsed, count / elapsed))
+    return count / elapsed
@@ -0,0 +1,104 @@
+"""
+/**         glstats.py
+ *
+ *          Per-frame cost of the render paths, for the default path and the
+ *          display list fast path (--fast): number of GL calls issued, time
+ *          in the Python of Scene.render (run with the GL calls stubbed out),
+ *          time in the state setting GL calls (mostly PyOpenGL wrapper
+ *          overhead) and in the draw calls (mostly the driver's own work).
+ *
+ *          python3 RenderWindow.py yourobject.obj --headless --gl-stats 500
+ ****
+"""
+
+import sys, time
+
+import OpenGL
+from OpenGL.GL import glClear, glFinish, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT
+from OpenGL.arrays import vbo
+
+
+# calls that hand geometry to the driver, most of their time is its work
+DRAW_CALLS = ("glDrawArrays", "glDrawElements", "glCallList")
+
+
+class CallCounter:
+    """ counts calls of the GL functions a set of modules imported, or that
+    any other object holds as attributes, and the time spent in draw calls
+    and in all other GL calls; with stub the calls are not made """
+    def __init__(self, *modules, stub=False):
+        self.count = 0
+        self.drawTime = 0.
+        self.stateTime = 0.
+        self.stub = stub
+        self.saved = []
+        for module in modules:
+            for name, function in list(vars(module).items()):
+                if name.startswith("gl") and callable(function):
+                    self.saved.append((module, name, function))
+                    setattr(module, name, self.wrap(name, function))
+
+    def wrap(self, name, function):
+        draw = name in DRAW_CALLS
+
+        def counted(*args, **kwargs):
+            self.count += 1
+            if self.stub:
+                return None
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            if draw:
+                self.drawTime += time.perf_counter() - start
+            else:
+                self.stateTime += time.perf_counter() - start
+            return result
+        return counted
+
+    def restore(self):
+        for module, name, function in self.saved:
+            setattr(module, name, function)
+
+
+def measure(window, frames, fast):
+    """ (GL calls, seconds in the Python of the render path, in the other GL
+    calls and in the draw calls) per frame of one render path """
+    scene = window.scene
+    scene.fast = fast
+    # first frame compiles the display list
+    scene.render()
+
+    # VBO.bind and unbind call glBindBuffer through the vbo implementation
+    modules = sys.modules[type(scene).__module__], vbo.get_implementation()
+
+    # with the GL calls stubbed out only the Python of the render path is left
+    counter = CallCounter(*modules, stub=True)
+    start = time.perf_counter()
+    for _ in range(frames):
+        scene.render()
+    python = time.perf_counter() - start
+    counter.restore()
+
+    counter = CallCounter(*modules)
+    for _ in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        scene.render()
+    glFinish()
+    counter.restore()
+    return counter.count // frames, python / frames, counter.stateTime / frames, counter.drawTime / frames
+
+
+def report(window, frames):
+    from export import Offscreen
+
+    fast = window.scene.fast
+    target = Offscreen(window.width, window.height)
+    target.bind()
+    print("error checking %s, error logging %s, times per frame"
+          % ("on" if OpenGL.ERROR_CHECKING else "off", "on" if OpenGL.ERROR_LOGGING else "off"))
+    for name, path in (("default", False), ("display list", True)):
+        calls, python, state, draw = measure(window, frames, path)
+        print("%-14s %4d GL calls %8.3f ms Python %8.3f ms other GL calls %8.3f ms draw calls"
+              % (name, calls, python * 1000, state * 1000, draw * 1000))
+    target.unbind()
+    target.delete()
+    window.scene.fast = fast
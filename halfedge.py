@@ -0,0 +1,157 @@
+"""
+/**         halfedge.py
+ *
+ *          Half-edge adjacency for triangle meshes, built with one sort over
+ *          the face array, and the silhouette/boundary outline drawn on top of
+ *          the shaded model.
+ *
+ *          Half-edge h = 3 * f + i runs from faces[f, i] to faces[f, (i+1) % 3].
+ ****
+"""
+
+from OpenGL.GL import glColor3f, glDepthFunc, glDisable, glDisableClientState, \
+    glDrawElements, glEnable, glEnableClientState, glVertexPointer, GL_ELEMENT_ARRAY_BUFFER, \
+    GL_FLOAT, GL_LEQUAL, GL_LESS, GL_LIGHTING, GL_LINES, GL_STREAM_DRAW, GL_UNSIGNED_INT, \
+    GL_VERTEX_ARRAY
+from OpenGL.arrays import vbo
+
+import numpy as np
+
+from loaders import weld, face_normals
+
+
+class EdgeIndex:
+    """ edge adjacency of an indexed triangle mesh """
+
+    # arrays stored in the mesh cache, prefixed with "edge_"
+    FIELDS = ("vertices", "faces", "edges", "valence", "edgeOf", "twin", "outgoing", "offsets")
+
+    def __init__(self, vertices, faces, **derived):
+        self.vertices = np.asarray(vertices, np.float32)
+        self.faces = np.asarray(faces, np.int32)
+        if derived:
+            for name in self.FIELDS[2:]:
+                setattr(self, name, derived[name])
+        else:
+            self.build()
+        self.faceNormals = face_normals(self.vertices, self.faces)
+
+    @classmethod
+    def fromPoints(cls, points):
+        """ index for the de-indexed triangle list the viewer renders """
+        return cls(*weld(points))
+
+    @classmethod
+    def fromCache(cls, cache):
+        """ index stored by arrays() in an .npz cache, None if there is none """
+        if "edge_faces" not in cache:
+            return None
+        return cls(**{name: cache["edge_" + name] for name in cls.FIELDS})
+
+    def arrays(self):
+        return {"edge_" + name: getattr(self, name) for name in self.FIELDS}
+
+    def build(self):
+        faces = self.faces
+        origin = faces.ravel()
+        target = faces[:, [1, 2, 0]].ravel()
+        lo, hi = np.minimum(origin, target), np.maximum(origin, target)
+        keys = lo.astype(np.int64) * len(self.vertices) + hi
+
+        # half-edges sharing an undirected edge become neighbours after sorting
+        order = np.argsort(keys, kind="mergesort")
+        sortedKeys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sortedKeys[1:] != sortedKeys[:-1]])
+        self.valence = np.diff(np.r_[starts, len(keys)]).astype(np.int32)
+        self.edges = np.stack([lo[order[starts]], hi[order[starts]]], axis=1).astype(np.int32)
+        self.edgeOf = np.empty(len(keys), np.int32)
+        self.edgeOf[order] = np.repeat(np.arange(len(starts), dtype=np.int32), self.valence)
+
+        # opposite half-edge, -1 on boundary and non-manifold edges
+        self.twin = np.full(len(keys), -1, np.int32)
+        manifold = starts[self.valence == 2]
+        a, b = order[manifold], order[manifold + 1]
+        self.twin[a] = b
+        self.twin[b] = a
+
+        # outgoing half-edges per vertex in CSR layout
+        self.outgoing = np.argsort(origin, kind="mergesort").astype(np.int32)
+        self.offsets = np.searchsorted(origin[self.outgoing], np.arange(len(self.vertices) + 1)).astype(np.int32)
+
+    # O(1) queries
+    def next(self, h):
+        return h - h % 3 + (h + 1) % 3
+
+    def face(self, h):
+        return h // 3
+
+    def faceNeighbors(self, f):
+        """ faces across the three edges of face f, -1 where there is none """
+        twins = self.twin[3 * f:3 * f + 3]
+        return np.where(twins >= 0, twins // 3, -1)
+
+    def vertexHalfedges(self, v):
+        return self.outgoing[self.offsets[v]:self.offsets[v + 1]]
+
+    def vertexNeighbors(self, v):
+        h = self.vertexHalfedges(v)
+        return self.faces.ravel()[self.next(h)]
+
+    def boundaryEdges(self):
+        return np.flatnonzero(self.valence == 1)
+
+    def nonManifoldEdges(self):
+        return np.flatnonzero(self.valence > 2)
+
+    def silhouetteEdges(self, eye=None, direction=None):
+        """ manifold edges between front and back facing faces
+
+        eye is the camera position in object space for a perspective view,
+        direction the object space view direction for an orthographic one.
+        """
+        if direction is not None:
+            facing = self.faceNormals @ np.asarray(direction, np.float32) > 0
+        else:
+            corner = self.vertices[self.faces[:, 0]]
+            facing = np.einsum("ij,ij->i", self.faceNormals, np.asarray(eye, np.float32) - corner) > 0
+        h = np.flatnonzero(self.twin > np.arange(len(self.twin)))
+        flips = facing[h // 3] != facing[self.twin[h] // 3]
+        return self.edgeOf[h[flips]]
+
+
+class Outline:
+    """ silhouette, boundary and non-manifold edges drawn as one line batch """
+    def __init__(self, index):
+        self.index = index
+        self.vbo = vbo.VBO(index.vertices)
+        self.ibo = vbo.VBO(np.zeros(2, np.uint32), usage=GL_STREAM_DRAW, target=GL_ELEMENT_ARRAY_BUFFER)
+        # boundary and non-manifold edges do not depend on the view
+        self.feature = np.r_[index.boundaryEdges(), index.nonManifoldEdges()]
+        self.color = [0., 0., 0.]
+
+    def draw(self, modelview, ortho):
+        """ modelview as returned by Scene.modelview() """
+        inverse = np.linalg.inv(modelview)
+        if ortho:
+            edges = self.index.silhouetteEdges(direction=(inverse @ [0., 0., 1., 0.])[:3])
+        else:
+            # setCamera places the eye 4 units in front of the modelview origin
+            edges = self.index.silhouetteEdges(eye=(inverse @ [0., 0., 4., 1.])[:3])
+        lines = self.index.edges[np.r_[edges, self.feature]].astype(np.uint32).ravel()
+        if not len(lines):
+            return
+
+        self.ibo.set_array(lines)
+        glDisable(GL_LIGHTING)
+        glDepthFunc(GL_LEQUAL)
+        glColor3f(*self.color)
+        self.vbo.bind()
+        self.ibo.bind()
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 12, self.vbo)
+        glDrawElements(GL_LINES, len(lines), GL_UNSIGNED_INT, self.ibo)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self.ibo.unbind()
+        self.vbo.unbind()
+        glDepthFunc(GL_LESS)
+        glEnable(GL_LIGHTING)
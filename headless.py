@@ -0,0 +1,50 @@
+"""
+/**         headless.py
+ *
+ *          Surfaceless EGL context for machines without any display, used by
+ *          RenderWindow when GLFW cannot open even a hidden window. All
+ *          rendering then goes to framebuffer objects. PyOpenGL has to be
+ *          imported with PYOPENGL_PLATFORM=egl for this to work.
+ ****
+"""
+
+import os, ctypes
+
+
+class EGLContext:
+    """ OpenGL (compatibility profile) context without a surface """
+    def __init__(self):
+        # mesa picks its native platform from the environment
+        os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+        # with error checking off (--fast) PyOpenGL leaves the EGL error
+        # checker undefined instead of None
+        from OpenGL.raw.EGL import _errors
+        if not hasattr(_errors, "_error_checker"):
+            _errors._error_checker = None
+        from OpenGL import EGL
+        self.EGL = EGL
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("could not initialize EGL")
+        if not EGL.eglBindAPI(EGL.EGL_OPENGL_API):
+            raise RuntimeError("EGL has no desktop OpenGL")
+
+        # no config and no surface (EGL_KHR_no_config_context, surfaceless_context)
+        noConfig = EGL.EGLConfig()
+        self.context = EGL.eglCreateContext(self.display, noConfig, EGL.EGL_NO_CONTEXT, None)
+        if self.context == EGL.EGL_NO_CONTEXT:
+            raise RuntimeError("could not create an EGL context")
+        self.makeCurrent()
+
+    def makeCurrent(self):
+        EGL = self.EGL
+        if not EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.context):
+            raise RuntimeError("could not make the EGL context current")
+
+    def destroy(self):
+        EGL = self.EGL
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
@@ -0,0 +1,114 @@
+"""
+/**         hotreload.py
+ *
+ *          Watch mode: polls the loaded model file, reparses it in a worker
+ *          process when it changes and hands the new arrays to
+ *          Scene.reload, which only uploads the vertex ranges that differ.
+ *
+ *          python3 RenderWindow.py yourobject.obj --watch
+ ****
+"""
+
+import os, time, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from loaders import load_model
+
+
+def changed_ranges(old, new, gap=64):
+    """ [start, stop) row ranges where old and new differ; runs less than
+    gap rows apart are merged to save upload calls """
+    changed = np.flatnonzero(np.any(old != new, axis=1))
+    if not len(changed):
+        return []
+    breaks = np.flatnonzero(np.diff(changed) > gap)
+    starts = np.r_[changed[0], changed[breaks + 1]]
+    stops = np.r_[changed[breaks], changed[-1]] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def parse(filename):
+    points, normals, data = load_model(filename)
+    return (np.asarray(points, np.float32), np.asarray(normals, np.float32),
+            np.asarray(data, np.float32))
+
+
+class ModelWatcher:
+    """ checks the file every interval seconds, poll() returns a newly parsed
+    model once, or None """
+    def __init__(self, filename, interval=0.25):
+        self.filename = filename
+        self.interval = interval
+        self.stamp = self.stat()
+        self.pending = None
+        self.checked = 0.
+        self.changed = None
+        self.future = None
+        self.pool = None
+        self.startPool()
+
+    def startPool(self):
+        # the OBJ parser is pure Python; in a thread it would hold the GIL
+        # and stall the render loop
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+        self.pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+
+    def stat(self):
+        try:
+            info = os.stat(self.filename)
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def poll(self):
+        now = time.perf_counter()
+        if self.future is not None:
+            if not self.future.done():
+                return None
+            future, self.future = self.future, None
+            try:
+                model = future.result()
+            except BrokenProcessPool:
+                # the parser died (out of memory, crash), the next change
+                # is parsed in a new one
+                print("reload of %s failed: parser process died" % self.filename)
+                self.startPool()
+                return None
+            except Exception as error:
+                # most likely a half written file, the next change retries
+                print("reload of %s failed: %s" % (self.filename, error))
+                return None
+            self.parseTime = now - self.started
+            return model
+
+        if now - self.checked < self.interval:
+            return None
+        self.checked = now
+        stamp = self.stat()
+        if stamp is None or stamp == self.stamp:
+            self.pending = None
+            return None
+        if stamp != self.pending:
+            # wait until the exporter is done writing
+            if self.pending is None:
+                self.changed = now
+            self.pending = stamp
+            return None
+        self.stamp, self.pending = stamp, None
+        self.started = now
+        try:
+            self.future = self.pool.submit(parse, self.filename)
+        except BrokenProcessPool:
+            self.startPool()
+            self.future = self.pool.submit(parse, self.filename)
+        return None
+
+    def close(self):
+        # a parse still running is not waited for
+        if self.future is not None:
+            self.future.cancel()
+        self.pool.shutdown(wait=False)
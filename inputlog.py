@@ -0,0 +1,157 @@
+"""
+/**         inputlog.py
+ *
+ *          Reproducible interaction benchmarks: Recorder logs every GLFW
+ *          callback RenderWindow receives and every frame it draws, replay
+ *          feeds a log back at recorded or maximum speed (also headless) and
+ *          traces the frame times, compare puts two traces side by side.
+ *
+ *          One JSON object per line, the same events the frame server takes:
+ *              {"event": "start", "t": 0, "width": 900, "height": 900}
+ *              {"event": "cursor", "t": 1.25, "x": 450, "y": 300}
+ *              {"event": "frame", "t": 1.26}
+ *
+ *          python3 RenderWindow.py yourobject.obj --record drag.log
+ *          python3 RenderWindow.py yourobject.obj --headless --replay drag.log --trace new.json
+ *          python3 inputlog.py compare old.json new.json
+ ****
+"""
+
+import sys, json, time
+
+import glfw
+from OpenGL.GL import glClear, glClearColor, glFinish, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT
+
+import numpy as np
+
+
+class Recorder:
+    """ wraps the window callbacks of a RenderWindow and logs them to a file """
+    def __init__(self, window, filename):
+        self.window = window
+        self.file = open(filename, "w")
+        self.start = time.perf_counter()
+        self.write(event="start", width=window.width, height=window.height)
+
+        win = window.window
+        glfw.set_mouse_button_callback(win, self.onMouseButton)
+        glfw.set_key_callback(win, self.onKeyboard)
+        glfw.set_cursor_pos_callback(win, self.mouseMoved)
+        glfw.set_window_size_callback(win, self.onSize)
+
+    def write(self, **message):
+        message["t"] = time.perf_counter() - self.start
+        self.file.write(json.dumps(message) + "\n")
+
+    def onMouseButton(self, win, button, action, mods):
+        # replay has no cursor to query
+        x, y = glfw.get_cursor_pos(win)
+        self.write(event="mouse_button", button=button, action=action, mods=mods, x=x, y=y)
+        self.window.onMouseButton(win, button, action, mods)
+
+    def onKeyboard(self, win, key, scancode, action, mods):
+        self.write(event="key", key=key, scancode=scancode, action=action, mods=mods)
+        self.window.onKeyboard(win, key, scancode, action, mods)
+
+    def mouseMoved(self, win, x, y):
+        self.write(event="cursor", x=x, y=y)
+        self.window.mouseMoved(win, x, y)
+
+    def onSize(self, win, width, height):
+        self.write(event="size", width=width, height=height)
+        self.window.onSize(win, width, height)
+
+    def frame(self):
+        self.write(event="frame")
+
+    def close(self):
+        self.file.close()
+
+
+def load(filename):
+    with open(filename) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def summary(times):
+    ms = np.asarray(times) * 1000
+    return {"frames": len(ms), "mean": ms.mean(), "p50": np.percentile(ms, 50),
+            "p95": np.percentile(ms, 95), "p99": np.percentile(ms, 99), "max": ms.max()}
+
+
+def replay(window, filename, speed=0., tracefile=None):
+    """ play a recording back into window, speed 0 runs as fast as possible;
+    returns the frame times (event handling, render and glFinish) in seconds """
+    from export import Offscreen
+
+    events = load(filename)
+    start = events[0]
+    if start["event"] != "start":
+        raise ValueError("%s is not an input recording" % filename)
+
+    window.handleEvent({"event": "size", "width": start["width"], "height": start["height"]})
+    target = Offscreen(window.width, window.height)
+    target.bind()
+    window.setCamera()
+    scene = window.scene
+    glClearColor(*scene.bgColor)
+
+    times = []
+    busy = 0.
+    begin = time.perf_counter()
+    for message in events[1:]:
+        if speed:
+            delay = begin + message["t"] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        tick = time.perf_counter()
+        if message["event"] == "frame":
+            if window.animation and scene.stream is not None:
+                scene.stream.update(scene.animator.frame(message["t"]))
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            scene.render()
+            glFinish()
+            times.append(busy + time.perf_counter() - tick)
+            busy = 0.
+            continue
+
+        window.handleEvent(message)
+        if message["event"] == "size":
+            target.delete()
+            target = Offscreen(window.width, window.height)
+            target.bind()
+            window.setCamera()
+        busy += time.perf_counter() - tick
+        if window.exitNow:
+            break
+    elapsed = time.perf_counter() - begin
+    target.unbind()
+    target.delete()
+
+    stats = summary(times)
+    print("replayed %d frames in %.2fs: frame time mean %.2f ms, p50 %.2f, p95 %.2f, p99 %.2f, max %.2f"
+          % (stats["frames"], elapsed, stats["mean"], stats["p50"], stats["p95"], stats["p99"], stats["max"]))
+    if tracefile:
+        with open(tracefile, "w") as file:
+            json.dump({"recording": filename, "speed": speed, "summary": stats,
+                       "frames": [t * 1000 for t in times]}, file)
+    return times
+
+
+def compare(old, new):
+    """ print the summaries of two replay traces and their ratio """
+    with open(old) as file:
+        a = json.load(file)["summary"]
+    with open(new) as file:
+        b = json.load(file)["summary"]
+    print("%-6s %10s %10s %8s" % ("ms", old, new, "ratio"))
+    for key in ("mean", "p50", "p95", "p99", "max"):
+        print("%-6s %10.2f %10.2f %7.2fx" % (key, a[key], b[key], b[key] / a[key]))
+    if a["frames"] != b["frames"]:
+        print("frame counts differ: %d vs %d" % (a["frames"], b["frames"]))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ["compare"] or len(sys.argv) != 4:
+        sys.exit("usage: inputlog.py compare old.json new.json")
+    compare(sys.argv[2], sys.argv[3])
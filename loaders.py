@@ -0,0 +1,297 @@
+"""
+/**         loaders.py
+ *
+ *          Mesh loaders. OBJ is parsed as text; binary PLY and STL files are
+ *          memory mapped and viewed through structured dtypes, so no element
+ *          is parsed in Python. All return the same (points, normals, data)
+ *          triple, the de-indexed triangle list Scene uploads.
+ ****
+"""
+
+import os
+
+import numpy as np
+
+
+# PLY scalar types
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "<i2", "int16": "<i2", "ushort": "<u2", "uint16": "<u2",
+    "int": "<i4", "int32": "<i4", "uint": "<u4", "uint32": "<u4",
+    "float": "<f4", "float32": "<f4", "double": "<f8", "float64": "<f8",
+}
+
+STL_RECORD = np.dtype([("normal", "<f4", 3), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+
+
+def face_normals(vertices, faces):
+    """ unnormalized face normals, their length is twice the triangle area """
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    return np.cross(b - a, c - a)
+
+
+def vertex_normals(vertices, faces):
+    """ area weighted vertex normals of an indexed triangle mesh """
+    fn = face_normals(vertices, faces)
+    normals = np.zeros_like(vertices)
+    for i in range(3):
+        np.add.at(normals, faces[:, i], fn)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    lengths[lengths == 0] = 1
+    return normals / lengths
+
+
+def weld(points, tolerance=None):
+    """ merge coincident vertices of a triangle soup
+
+    Positions are snapped to a grid and the three cell coordinates are packed
+    into one 64 bit key (21 bits per axis), so welding is a single np.unique
+    over integers. Returns (vertices, faces).
+    """
+    points = np.asarray(points, np.float32).reshape(-1, 3)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    if tolerance is None:
+        tolerance = max(float((hi - lo).max()), 1e-12) * 1e-6
+    cells = np.floor((points - lo) / tolerance).astype(np.int64)
+    if cells.max() >= 1 << 21:
+        raise ValueError("weld tolerance %g too small for the model extent" % tolerance)
+    keys = (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return points[first], inverse.reshape(-1, 3).astype(np.int32)
+
+
+def deindex(vertices, normals, faces):
+    """ expand an indexed mesh to the (points, normals, data) triple of read_file """
+    points = vertices[faces].reshape(-1, 3).astype(np.float32)
+    nls = normals[faces].reshape(-1, 3).astype(np.float32)
+    # interleaved vertex/normal pairs, stride 24 as in Scene.render
+    data = np.stack([points, nls], axis=1).reshape(-1, 3)
+    return points, nls, data
+
+
+def read_ply_header(file):
+    """ returns (format, [(element, count, [(name, type or (countType, itemType))])], size) """
+    if file.readline().strip() != b"ply":
+        raise ValueError("not a PLY file")
+    fmt = None
+    elements = []
+    while True:
+        line = file.readline()
+        if not line:
+            raise ValueError("PLY header without end_header")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "format":
+            fmt = words[1]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], (PLY_TYPES[words[2]], PLY_TYPES[words[3]])))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+        elif words[0] == "end_header":
+            return fmt, elements, file.tell()
+
+
+def read_ply(filename):
+    """ binary little endian PLY with a vertex and a face element """
+    with open(filename, "rb") as file:
+        fmt, elements, offset = read_ply_header(file)
+    if fmt != "binary_little_endian":
+        raise ValueError("%s: only binary_little_endian PLY is supported, got %s" % (filename, fmt))
+
+    vertices = normals = faces = None
+    for name, count, properties in elements:
+        lists = [p for p in properties if isinstance(p[1], tuple)]
+        if not lists:
+            dtype = np.dtype(properties)
+            table = np.memmap(filename, dtype, "r", offset, (count,))
+            if name == "vertex":
+                vertices = np.stack([table[c] for c in "xyz"], axis=1).astype(np.float32)
+                if "nx" in dtype.names:
+                    normals = np.stack([table[c] for c in ("nx", "ny", "nz")], axis=1).astype(np.float32)
+            offset += count * dtype.itemsize
+            continue
+
+        if name != "face" or len(properties) != 1:
+            raise ValueError("%s: unsupported list element %r" % (filename, name))
+        # faces are read as fixed size records, so every face needs the same corner count
+        countType, itemType = properties[0][1]
+        corners = int(np.memmap(filename, countType, "r", offset, (1,))[0]) if count else 3
+        dtype = np.dtype([("n", countType), ("v", itemType, corners)])
+        table = np.memmap(filename, dtype, "r", offset, (count,))
+        if np.any(table["n"] != corners):
+            raise ValueError("%s: mixed polygon sizes are not supported" % filename)
+        polygons = np.asarray(table["v"], np.int32)
+        # fan triangulation
+        faces = np.stack([np.stack([polygons[:, 0], polygons[:, i], polygons[:, i + 1]], axis=1)
+                          for i in range(1, corners - 1)], axis=1).reshape(-1, 3)
+        offset += count * dtype.itemsize
+
+    if vertices is None or faces is None:
+        raise ValueError("%s: PLY needs vertex and face elements" % filename)
+    if normals is None:
+        normals = vertex_normals(vertices, faces)
+    return deindex(vertices, normals, faces)
+
+
+def read_stl(filename):
+    """ binary STL, the triangle soup is welded before normals are computed """
+    size = os.path.getsize(filename)
+    count = int(np.memmap(filename, "<u4", "r", 80, (1,))[0]) if size >= 84 else -1
+    if size != 84 + count * STL_RECORD.itemsize:
+        raise ValueError("%s: not a binary STL file" % filename)
+
+    records = np.memmap(filename, STL_RECORD, "r", 84, (count,))
+    vertices, faces = weld(records["v"])
+    return deindex(vertices, vertex_normals(vertices, faces), faces)
+
+
+def optimize(points, normals):
+    """ index a de-indexed mesh
+
+    Identical vertex/normal pairs are merged and the vertices renumbered in
+    order of first use, which keeps the index stream cache friendly.
+    Returns (vertices, normals, faces).
+    """
+    corners = np.hstack([np.asarray(points, np.float32), np.asarray(normals, np.float32)])
+    keys = np.ascontiguousarray(corners).view(np.dtype((np.void, corners.itemsize * 6))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    unique = corners[first[order]]
+    return unique[:, :3], unique[:, 3:], rank[inverse].reshape(-1, 3).astype(np.int32)
+
+
+def source_stamp(filename):
+    """ modification time and size that identify a source file version """
+    stat = os.stat(filename)
+    return np.array([stat.st_mtime_ns, stat.st_size], np.int64)
+
+
+def cache_is_current(cacheFile, source):
+    if not os.path.exists(cacheFile):
+        return False
+    with np.load(cacheFile) as cache:
+        return "source" in cache and np.array_equal(cache["source"], source_stamp(source))
+
+
+def write_cache(cacheFile, source, vertices, normals, faces, **extra):
+    """ store an indexed mesh; written to a temporary file first so an
+    interrupted run never leaves a truncated cache behind """
+    tmp = cacheFile + ".tmp.npz"
+    np.savez(tmp, vertices=vertices, normals=normals, faces=faces,
+             source=source_stamp(source), **extra)
+    os.replace(tmp, cacheFile)
+
+
+def read_cache(filename):
+    with np.load(filename) as cache:
+        return deindex(cache["vertices"], cache["normals"], cache["faces"])
+
+
+def normalize(x):
+    return x / np.linalg.norm(x)
+
+
+def calcNormals(x, y, z):
+
+    xy = normalize(y) - normalize(x)
+    xz = normalize(z) - normalize(x)
+
+    n = np.cross(xy, xz)
+
+    return n
+
+
+
+def read_file(filename):
+    vertices = []
+    normals = []
+    textures = []
+    points = []
+    nls = []
+    data = []
+    vertex_normals = {}
+    faces = []
+
+    with open(filename) as file:
+        for line in file:
+            if line.startswith("vn"):
+                x,y,z = line.strip("vn ").split()
+                normals.append(np.array([x,y,z]).astype(float))
+                continue
+            if line.startswith("vt"):
+                x,y = line.strip("vt ").split()
+                textures.append(np.array([x,y,z]).astype(float))
+                continue
+            if line.startswith("v"):
+                x,y,z = line.strip("v ").split()
+                vertices.append(np.array([x,y,z]).astype(float))
+                continue
+            if line.startswith("f"):
+                # f v/vt/vn v/vt/vn v/vt/vn
+                x,y,z = line.strip("f ").split()
+                if len(x.split("/")) == 1:
+                    x = np.array([int(x),0,0])
+                    y = np.array([int(y),0,0])
+                    z = np.array([int(z),0,0])
+                else:
+                    x = np.array([int(x) if x else 0 for x in line.strip("f ").split()[0].split("/")])
+                    y = np.array([int(x) if x else 0 for x in line.strip("f ").split()[1].split("/")])
+                    z = np.array([int(x) if x else 0 for x in line.strip("f ").split()[2].split("/")])
+
+                if x[2] != 0: # normals are given
+
+                    vertex_normals[x[0]] = normals[x[2] - 1]
+                    vertex_normals[y[0]] = normals[y[2] - 1]
+                    vertex_normals[z[0]] = normals[z[2] - 1]
+
+                else:
+
+                    # calc normal for face
+                    n = calcNormals(np.array(vertices[x[0] - 1]), np.array(vertices[y[0] - 1]), np.array(vertices[z[0] - 1]))
+
+                    # if there already is a normal for a vertex, just add n to the existing normal
+                    if vertex_normals.get(x[0], np.array(0)).any():
+                        vertex_normals[x[0]] += normalize(n)
+                    else:
+                        vertex_normals[x[0]] = normalize(n)
+
+                    if vertex_normals.get(y[0], np.array(0)).any():
+                        vertex_normals[y[0]] += normalize(n)
+                    else:
+                        vertex_normals[y[0]] = normalize(n)
+
+                    if vertex_normals.get(z[0], np.array(0)).any():
+                        vertex_normals[z[0]] += normalize(n)
+                    else:
+                        vertex_normals[z[0]] = normalize(n)
+
+                faces.append([x, y, z])
+                continue
+
+
+    for face in faces:
+        for vertex in face:
+            data.append(vertices[vertex[0] - 1])
+            points.append(vertices[vertex[0] - 1])
+            data.append(vertex_normals[vertex[0]])
+            nls.append(vertex_normals[vertex[0]])
+
+    return points, nls, data
+
+
+def load_model(filename):
+    """ choose the loader by file extension """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".ply":
+        return read_ply(filename)
+    if ext == ".stl":
+        return read_stl(filename)
+    if ext == ".npz":
+        return read_cache(filename)
+    return read_file(filename)
@@ -0,0 +1,182 @@
+"""
+/**         occlusion.py
+ *
+ *          Occlusion culling for Scene.render: the triangle list is split
+ *          into spatially compact clusters (Morton order of the centroids).
+ *          Every frame the clusters that were visible last frame are drawn
+ *          first as occluders, then the bounding boxes of all clusters are
+ *          tested with occlusion queries against that depth buffer and the
+ *          remaining clusters are drawn with conditional rendering, so the
+ *          GPU skips them without the CPU ever waiting on a query. Query
+ *          results are read one frame late, only once they are available,
+ *          to pick the next frame's occluders.
+ *
+ *          python3 RenderWindow.py yourobject.obj --headless --occlusion-bench 200
+ ****
+"""
+
+import math, time, ctypes
+
+from OpenGL.GL import glBeginConditionalRender, glBeginQuery, glClear, glColorMask, glDepthMask, \
+    glDisable, glDisableClientState, glDrawArrays, glDrawElements, glEnable, glEnableClientState, \
+    glEndConditionalRender, glEndQuery, glFinish, glGenQueries, glDeleteQueries, \
+    glGetQueryObjectuiv, glVertexPointer, GL_ANY_SAMPLES_PASSED, GL_COLOR_BUFFER_BIT, \
+    GL_DEPTH_BUFFER_BIT, GL_ELEMENT_ARRAY_BUFFER, GL_FALSE, GL_FLOAT, GL_LIGHTING, \
+    GL_NORMAL_ARRAY, GL_QUERY_NO_WAIT, GL_QUERY_RESULT, GL_QUERY_RESULT_AVAILABLE, GL_TRIANGLES, \
+    GL_TRUE, GL_UNSIGNED_INT
+from OpenGL.arrays import vbo
+
+import numpy as np
+
+import camera
+
+# corners of a box as (x, y, z) picks from (min, max), two triangles per side
+BOX_CORNERS = np.array([[(i >> 0) & 1, (i >> 1) & 1, (i >> 2) & 1] for i in range(8)], bool)
+BOX_TRIANGLES = np.array([0, 2, 1, 1, 2, 3, 4, 5, 6, 5, 7, 6, 0, 1, 4, 1, 5, 4,
+                          2, 6, 3, 3, 6, 7, 0, 4, 2, 2, 4, 6, 1, 3, 5, 3, 7, 5])
+
+
+def morton(points, bits=10):
+    """ interleaved bits of points quantized to a 2**bits grid """
+    low, high = points.min(axis=0), points.max(axis=0)
+    cells = ((points - low) / np.maximum(high - low, 1e-12) * (2 ** bits - 1)).astype(np.uint64)
+    code = np.zeros(len(points), np.uint64)
+    for bit in range(bits):
+        for axis in range(3):
+            code |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return code
+
+
+class OcclusionCuller:
+    """ draws the triangle list of the bound vertex arrays cluster by cluster """
+    def __init__(self, points, clusterSize=1024):
+        triangles = np.asarray(points, np.float32).reshape(-1, 3, 3)
+        order = np.argsort(morton(triangles.mean(axis=1)), kind="mergesort")
+        self.starts = np.arange(0, len(order), clusterSize)
+        self.counts = np.minimum(clusterSize, len(order) - self.starts)
+
+        # vertex indices in cluster order, drawn straight from Scene.uni_vbo
+        indices = (order[:, None] * 3 + np.arange(3)).astype(np.uint32).ravel()
+        self.ibo = vbo.VBO(indices, target=GL_ELEMENT_ARRAY_BUFFER)
+
+        clusters = np.split(triangles[order], self.starts[1:])
+        self.low = np.array([c.reshape(-1, 3).min(axis=0) for c in clusters])
+        self.high = np.array([c.reshape(-1, 3).max(axis=0) for c in clusters])
+        boxes = np.where(BOX_CORNERS[None, BOX_TRIANGLES], self.high[:, None], self.low[:, None])
+        self.boxes = vbo.VBO(np.ascontiguousarray(boxes, np.float32))
+
+        self.queries = [int(q) for q in np.atleast_1d(glGenQueries(len(self.starts)))]
+        # nothing is known yet, so everything starts as an occluder
+        self.visible = np.ones(len(self.starts), bool)
+        self.pending = None
+        self.triangles = len(order)
+        self.skipped = 0
+        self.tested = 0
+
+    def collect(self):
+        """ last frame's query results, if the GPU has them ready """
+        if self.pending is None:
+            return
+        # queries finish in order, the last one being ready means all are
+        if not glGetQueryObjectuiv(self.queries[-1], GL_QUERY_RESULT_AVAILABLE):
+            return
+        for i, query in enumerate(self.queries):
+            self.visible[i] = bool(glGetQueryObjectuiv(query, GL_QUERY_RESULT))
+        conditional = self.pending
+        self.skipped += int(self.counts[conditional & ~self.visible].sum())
+        self.tested += self.triangles
+        self.pending = None
+
+    def eyeInside(self, modelview, ortho):
+        """ boxes the near plane cuts would fail their query, draw them anyway """
+        if ortho:
+            return np.zeros(len(self.starts), bool)
+        eye = (np.linalg.inv(modelview) @ [0., 0., camera.EYE_DISTANCE, 1.])[:3]
+        margin = camera.NEAR * np.abs(np.linalg.inv(modelview)[:3, :3]).sum(axis=1)
+        return np.all((eye > self.low - margin) & (eye < self.high + margin), axis=1)
+
+    def drawCluster(self, i):
+        glDrawElements(GL_TRIANGLES, int(self.counts[i]) * 3, GL_UNSIGNED_INT,
+                       ctypes.c_void_p(int(self.starts[i]) * 12))
+
+    def draw(self, data, modelview, ortho):
+        """ call with the vertex and normal arrays of Scene set up from the
+        interleaved VBO data and enabled """
+        self.collect()
+        occluders = self.visible | self.eyeInside(modelview, ortho)
+
+        self.ibo.bind()
+        for i in np.flatnonzero(occluders):
+            self.drawCluster(i)
+
+        # bounding boxes only touch the queries
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glDepthMask(GL_FALSE)
+        glDisable(GL_LIGHTING)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        self.boxes.bind()
+        glVertexPointer(3, GL_FLOAT, 12, self.boxes)
+        self.boxes.unbind()
+        for i, query in enumerate(self.queries):
+            glBeginQuery(GL_ANY_SAMPLES_PASSED, query)
+            glDrawArrays(GL_TRIANGLES, i * 36, 36)
+            glEndQuery(GL_ANY_SAMPLES_PASSED)
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+        glDepthMask(GL_TRUE)
+        glEnable(GL_LIGHTING)
+        glEnableClientState(GL_NORMAL_ARRAY)
+
+        # the rest only if its box passed, decided on the GPU
+        data.bind()
+        glVertexPointer(3, GL_FLOAT, 24, data)
+        for i in np.flatnonzero(~occluders):
+            glBeginConditionalRender(self.queries[i], GL_QUERY_NO_WAIT)
+            self.drawCluster(i)
+            glEndConditionalRender()
+        self.ibo.unbind()
+        self.pending = ~occluders
+
+    def skippedFraction(self):
+        return self.skipped / self.tested if self.tested else 0.
+
+    def delete(self):
+        glDeleteQueries(len(self.queries), self.queries)
+        self.ibo.delete()
+        self.boxes.delete()
+
+
+def benchmark(window, frames=200):
+    """ frame time of a turntable with and without culling """
+    from export import Offscreen
+
+    scene = window.scene
+    target = Offscreen(window.width, window.height)
+    target.bind()
+    window.setCamera()
+    base = scene.actOri
+    culler = OcclusionCuller(scene.points)
+
+    def frame(useCuller):
+        scene.culler = culler if useCuller else None
+        start = time.perf_counter()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        scene.render()
+        glFinish()
+        return time.perf_counter() - start
+
+    # both paths render every view in turn, so drifting machine load hits
+    # them alike; the culler only depends on its own previous frame
+    times = []
+    for i in range(frames):
+        scene.actOri = base * scene.rotate(2 * math.pi * i / frames, [0, 1, 0])
+        times.append((frame(False), frame(True)))
+    plain, culled = np.median(times, axis=0)
+    scene.actOri = base
+    scene.culler = None
+    target.unbind()
+    target.delete()
+
+    print("occlusion culling: %d clusters, %.1f%% of triangles skipped, frame time %.2f ms -> %.2f ms (%+.1f%%)"
+          % (len(culler.starts), 100 * culler.skippedFraction(), plain * 1000, culled * 1000,
+             100 * (culled - plain) / plain))
+    culler.delete()
@@ -0,0 +1,74 @@
+"""
+/**         pngwriter.py
+ *
+ *          Minimal PNG encoder on top of zlib, so rendered images can be
+ *          written without an imaging library.
+ ****
+"""
+
+import zlib, struct
+
+import numpy as np
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def chunk(tag, payload):
+    return (struct.pack(">I", len(payload)) + tag + payload +
+            struct.pack(">I", zlib.crc32(tag + payload) & 0xffffffff))
+
+
+def header(width, height, channels):
+    colorType = {3: 2, 4: 6}[channels]
+    return SIGNATURE + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, colorType, 0, 0, 0))
+
+
+def scanlines(pixels):
+    """ rows with filter type 0 (none) in front """
+    height, width, channels = pixels.shape
+    raw = np.zeros((height, width * channels + 1), np.uint8)
+    raw[:, 1:] = pixels.reshape(height, width * channels)
+    return raw.tobytes()
+
+
+def write_png(filename, pixels, level=6):
+    """ write an (h, w, 3|4) uint8 array as PNG, first row is the top row;
+    filename may also be an open binary file """
+    height, width, channels = pixels.shape
+    # zlib releases the GIL, so several encoder threads run in parallel
+    data = (header(width, height, channels) +
+            chunk(b"IDAT", zlib.compress(scanlines(pixels), level)) +
+            chunk(b"IEND", b""))
+    if hasattr(filename, "write"):
+        filename.write(data)
+        return
+    with open(filename, "wb") as file:
+        file.write(data)
+
+
+class PNGStream:
+    """ PNG written a band of rows at a time, so the whole image never has to
+    be in memory """
+    def __init__(self, filename, width, height, channels=3, level=6):
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.file = open(filename, "wb")
+        self.file.write(header(width, height, channels))
+        self.compressor = zlib.compressobj(level)
+
+    def write(self, pixels):
+        """ append the next (rows, width, channels) band, top to bottom """
+        self.rows += len(pixels)
+        if self.rows > self.height or pixels.shape[1] != self.width:
+            raise ValueError("band does not fit the image")
+        data = self.compressor.compress(scanlines(pixels))
+        if data:
+            self.file.write(chunk(b"IDAT", data))
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError("%d of %d rows written" % (self.rows, self.height))
+        self.file.write(chunk(b"IDAT", self.compressor.flush()))
+        self.file.write(chunk(b"IEND", b""))
+        self.file.close()
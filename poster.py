@@ -0,0 +1,123 @@
+"""
+/**         poster.py
+ *
+ *          Print resolution stills: splits a large image into tiles no bigger
+ *          than the largest framebuffer object, renders each tile with its
+ *          part of the setCamera frustum, optionally supersampled and box
+ *          filtered in NumPy, and streams finished rows of tiles into the
+ *          PNG. Only one row of tiles is held in memory at a time.
+ *
+ *          python3 RenderWindow.py bunny.obj --headless --poster bunny.png --poster-size 16384 --supersample 2
+ ****
+"""
+
+import sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenGL.GL import glClear, glClearColor, glFrustum, glGetIntegerv, glLoadIdentity, \
+    glMatrixMode, glOrtho, glTranslatef, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, \
+    GL_MAX_RENDERBUFFER_SIZE, GL_MAX_VIEWPORT_DIMS, GL_MODELVIEW, GL_PROJECTION
+
+import numpy as np
+
+import camera
+from export import Offscreen, PixelReader
+from pngwriter import PNGStream
+
+
+def downsample(pixels, factor):
+    """ box filter factor x factor pixel blocks """
+    if factor == 1:
+        return pixels
+    height, width = pixels.shape[0] // factor, pixels.shape[1] // factor
+    blocks = pixels.reshape(height, factor, width, factor, 3).astype(np.uint16)
+    return ((blocks.sum(axis=(1, 3)) + factor * factor // 2) // (factor * factor)).astype(np.uint8)
+
+
+def max_tile():
+    """ largest square the framebuffer and the viewport can hold """
+    return min(int(glGetIntegerv(GL_MAX_RENDERBUFFER_SIZE)), *map(int, glGetIntegerv(GL_MAX_VIEWPORT_DIMS)))
+
+
+def peak_memory():
+    """ peak memory part of the report, empty without the resource module (Windows) """
+    try:
+        import resource
+    except ImportError:
+        return ""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    peak /= 1024 * 1024 if sys.platform == "darwin" else 1024
+    return ", peak memory %.0f MB" % peak
+
+
+def render_poster(window, filename, width, height, supersample=1, tile=2048, level=6):
+    """ render the current view of window into a width x height PNG """
+    factor = supersample
+    # tiles must split into whole output pixels
+    tile = min(tile, max_tile()) // factor * factor
+    fullWidth, fullHeight = width * factor, height * factor
+    cols = -(-fullWidth // tile)
+    rows = -(-fullHeight // tile)
+    # same field of view as the window would have at this aspect ratio
+    bounds = camera.frustum(width, height, window.ortho)
+
+    scene = window.scene
+    target = Offscreen(tile, tile)
+    target.bind()
+    reader = PixelReader(tile, tile, count=2)
+    png = PNGStream(filename, width, height, level=level)
+    writer = ThreadPoolExecutor(1)
+    writing = None
+    strip = None
+    glClearColor(*scene.bgColor)
+
+    def place(tag, pixels):
+        nonlocal strip, writing
+        row, col = tag
+        # edge tiles reach past the image
+        h = min(tile, fullHeight - row * tile) // factor
+        w = min(tile, fullWidth - col * tile) // factor
+        if col == 0:
+            strip = np.empty((h, width, 3), np.uint8)
+        x = col * tile // factor
+        strip[:, x:x + w] = downsample(pixels[:h * factor, :w * factor], factor)
+        if col == cols - 1:
+            # at most one row is compressed while the next is rendered
+            if writing is not None:
+                writing.result()
+            writing = writer.submit(png.write, strip)
+            strip = None
+
+    start = time.perf_counter()
+    for row in range(rows):
+        for col in range(cols):
+            glMatrixMode(GL_PROJECTION)
+            glLoadIdentity()
+            part = camera.tile_frustum(bounds, fullWidth, fullHeight, col * tile, row * tile, tile)
+            if window.ortho:
+                glOrtho(*part)
+            else:
+                glFrustum(*part)
+                glTranslatef(0., 0., -camera.EYE_DISTANCE)
+            glMatrixMode(GL_MODELVIEW)
+
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            scene.render()
+            for tag, pixels in reader.read((row, col)):
+                place(tag, pixels)
+    for tag, pixels in reader.flush():
+        place(tag, pixels)
+    if writing is not None:
+        writing.result()
+    writer.shutdown()
+    png.close()
+    elapsed = time.perf_counter() - start
+
+    reader.delete()
+    target.unbind()
+    target.delete()
+    window.setCamera()
+
+    print("%s: %dx%d, %dx supersampled, %d tiles of %d px in %.1fs%s"
+          % (filename, width, height, factor, rows * cols, tile, elapsed, peak_memory()))
@@ -0,0 +1,257 @@
+"""
+/**         server.py
+ *
+ *          Frame streaming server: renders the Scene offscreen and takes the
+ *          input a RenderWindow handles (mouse buttons, cursor, keys, size)
+ *          over a local TCP connection, streaming encoded frames back.
+ *
+ *          Client -> server: one JSON object per line, e.g.
+ *              {"event": "cursor", "x": 450, "y": 300, "t": 12.5}
+ *              {"event": "mouse_button", "button": 0, "action": 1, "mods": 0}
+ *              {"event": "key", "key": 65, "scancode": 0, "action": 1, "mods": 0}
+ *              {"event": "size", "width": 640, "height": 480}
+ *          "t" is an optional client timestamp, echoed with the next frame.
+ *
+ *          Server -> client: frames as a header (payload length, echoed
+ *          timestamp, frame number; ">IdI") followed by the PNG or JPEG data.
+ *
+ *          Rendering stays on the thread owning the GL context; encoding runs
+ *          on a worker pool and each client only ever gets the newest frame,
+ *          frames rendered while it is still busy are dropped.
+ ****
+"""
+
+import io, json, time, struct, asyncio, logging
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenGL.error import GLError
+from OpenGL.GL import glClear, glClearColor, glPixelStorei, glReadPixels, \
+    GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, GL_PACK_ALIGNMENT, GL_RGB, GL_UNSIGNED_BYTE
+
+import numpy as np
+
+from export import Offscreen
+from pngwriter import write_png
+from poster import max_tile
+
+# JPEG needs Pillow, PNG works without it
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HEADER = struct.Struct(">IdI")
+
+log = logging.getLogger("viewer")
+
+
+def encode(pixels, fmt, quality=85):
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        Image.fromarray(pixels).save(buf, "JPEG", quality=quality)
+    else:
+        write_png(buf, pixels, level=1)
+    return buf.getvalue()
+
+
+class Client:
+    """ one connection; holds only the newest frame not sent yet """
+    def __init__(self, writer):
+        self.writer = writer
+        self.frame = None
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, frame):
+        if self.frame is not None:
+            self.dropped += 1
+        self.frame = frame
+        self.ready.set()
+
+
+class FrameServer:
+    def __init__(self, window, host="127.0.0.1", port=8765, fmt="png", workers=None):
+        if fmt == "jpeg" and Image is None:
+            raise RuntimeError("JPEG streaming needs Pillow, use PNG instead")
+        self.window = window
+        self.host = host
+        self.port = port
+        self.fmt = fmt
+        self.pool = ThreadPoolExecutor(workers)
+        self.clients = set()
+        self.target = None
+        self.dirty = True
+        self.stamp = 0.
+        self.frames = 0
+        self.running = True
+
+    def resize(self, width, height):
+        """ new render target; if it cannot be made the old one stays """
+        target = Offscreen(width, height)
+        if self.target is not None:
+            self.target.delete()
+        self.target = target
+        self.target.bind()
+
+    def dispatch(self, message):
+        """ feed one client event to the RenderWindow handlers """
+        if message["event"] == "size":
+            width, height = int(message["width"]), int(message["height"])
+            limit = max_tile()
+            if not (1 <= width <= limit and 1 <= height <= limit):
+                raise ValueError("size must be 1 to %d pixels each way" % limit)
+            # the target first, a failure leaves the window size alone
+            self.resize(width, height)
+            message = dict(message, width=width, height=height)
+        self.window.handleEvent(message)
+        self.stamp = message.get("t", self.stamp)
+        self.dirty = True
+
+    def renderFrame(self):
+        rw = self.window
+        glClearColor(*rw.scene.bgColor)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        rw.scene.render()
+        # synchronous read: a PBO ring would add frames of latency
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        pixels = glReadPixels(0, 0, rw.width, rw.height, GL_RGB, GL_UNSIGNED_BYTE)
+        pixels = np.frombuffer(pixels, np.uint8).reshape(rw.height, rw.width, 3)[::-1]
+        self.frames += 1
+        return pixels, self.stamp, self.frames
+
+    async def renderLoop(self):
+        period = 1.0 / self.window.frame_rate
+        while self.running:
+            start = time.perf_counter()
+            animated = self.window.animation and self.window.scene.stream is not None
+            if animated:
+                scene = self.window.scene
+                scene.stream.update(scene.animator.frame(start))
+            if self.window.watcher is not None and self.window.checkReload():
+                self.dirty = True
+            if self.clients and (self.dirty or animated):
+                self.dirty = False
+                frame = self.renderFrame()
+                for client in self.clients:
+                    client.offer(frame)
+            await asyncio.sleep(max(0., period - (time.perf_counter() - start)))
+
+    async def send(self, client):
+        loop = asyncio.get_running_loop()
+        while True:
+            await client.ready.wait()
+            client.ready.clear()
+            pixels, stamp, number = client.frame
+            client.frame = None
+            data = await loop.run_in_executor(self.pool, encode, pixels, self.fmt)
+            client.writer.write(HEADER.pack(len(data), stamp, number) + data)
+            await client.writer.drain()
+            client.sent += 1
+
+    async def handle(self, reader, writer):
+        client = Client(writer)
+        self.clients.add(client)
+        self.dirty = True
+        sender = asyncio.ensure_future(self.send(client))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.dispatch(json.loads(line))
+                except (ValueError, KeyError, TypeError, RuntimeError, GLError) as error:
+                    # a bad message is dropped, the connection stays
+                    log.warning("ignored client message %r: %s", line[:200], error)
+                    continue
+                if self.window.exitNow:
+                    # ESC closes this connection, not the server
+                    self.window.exitNow = False
+                    break
+        finally:
+            sender.cancel()
+            self.clients.discard(client)
+            writer.close()
+            print("client done: %d frames sent, %d stale frames dropped" % (client.sent, client.dropped))
+
+    async def serve(self):
+        self.resize(self.window.width, self.window.height)
+        self.window.setCamera()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print("serving frames on %s:%d (%s)" % (self.host, self.port, self.fmt))
+        async with server:
+            await self.renderLoop()
+            # let open connections end on their own, asyncio.run would
+            # cancel their handlers
+            for client in list(self.clients):
+                client.writer.close()
+            while self.clients:
+                await asyncio.sleep(0.01)
+
+
+async def run_client(host, port, width, height, moves=200, rate=120.):
+    """ local client stand-in: drags the arcball and measures latency and fps """
+    reader, writer = await asyncio.open_connection(host, port)
+
+    def send(**message):
+        message["t"] = time.perf_counter()
+        writer.write((json.dumps(message) + "\n").encode())
+
+    latencies = []
+    frames = 0
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal frames
+        last = 0.
+        while not done.is_set():
+            try:
+                header = await reader.readexactly(HEADER.size)
+                length, stamp, _ = HEADER.unpack(header)
+                await reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                break
+            frames += 1
+            # only frames that reflect a new input event count for latency
+            if stamp > last:
+                latencies.append(time.perf_counter() - stamp)
+                last = stamp
+
+    receiver = asyncio.ensure_future(receive())
+    start = time.perf_counter()
+    send(event="cursor", x=width / 2, y=height / 2)
+    send(event="mouse_button", button=0, action=1, mods=0, x=width / 2, y=height / 2)
+    for i in range(moves):
+        angle = 2 * np.pi * i / moves
+        send(event="cursor", x=width / 2 + width / 4 * np.cos(angle), y=height / 2 + height / 4 * np.sin(angle))
+        await writer.drain()
+        await asyncio.sleep(1. / rate)
+    send(event="mouse_button", button=0, action=0, mods=0)
+    await writer.drain()
+    await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - start
+    done.set()
+    writer.close()
+    receiver.cancel()
+
+    latencies = np.array(latencies) * 1000
+    print("client: %d frames in %.2fs (%.1f fps), input to frame latency "
+          "mean %.1f ms, p95 %.1f ms, max %.1f ms"
+          % (frames, elapsed, frames / elapsed, latencies.mean(), np.percentile(latencies, 95), latencies.max()))
+
+
+def main(window, port, fmt="png", bench=None):
+    server = FrameServer(window, port=port, fmt=fmt)
+
+    async def run():
+        task = asyncio.ensure_future(server.serve())
+        if bench:
+            # give the server a moment to listen
+            await asyncio.sleep(0.1)
+            await run_client(server.host, port, window.width, window.height, bench)
+            server.running = False
+        await task
+
+    asyncio.run(run())
+    server.pool.shutdown()
@@ -0,0 +1,230 @@
+"""
+/**         softraster.py
+ *
+ *          GL-free render backend: a vectorized NumPy rasterizer for machines
+ *          that cannot create any GL context. It takes the mesh arrays of
+ *          Scene and the camera of setCamera, transforms all vertices in one
+ *          matmul, lights them like the fixed-function pipeline in
+ *          Scene.render, bins the triangles into screen tiles and rasterizes
+ *          the tiles on a thread pool with barycentric tests and a z-buffer.
+ *
+ *          python3 softraster.py yourobject.obj --out preview.png
+ ****
+"""
+
+import os, time, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import camera
+from loaders import load_model
+from pngwriter import write_png
+
+# Scene defaults
+COLOR = [0.1, 0.5, 0.8, 1.0]
+BG_COLOR = [1., 1., 1., 1.]
+
+# triangles tested against a tile at once, bounds the temporaries per thread
+CHUNK = 256
+
+
+def shade(normals, color):
+    """ per-vertex lighting of eye space normals, as GL computes it for Scene.render
+
+    GL_LIGHT0 is a white directional light along +z and the viewer is at
+    infinity, so both n.l and n.h are the z component of the normal. The
+    ambient term is the default light model ambient times the default
+    material ambient (0.2 * 0.2).
+    """
+    ndotl = np.clip(normals[:, 2], 0, None)
+    specular = np.where(ndotl > 0, ndotl ** camera.MAT_SHININESS[0], 0)
+    c = (0.04 + ndotl[:, None] * np.asarray(color[:3]) +
+         specular[:, None] * np.asarray(camera.MAT_SPECULAR[:3]))
+    return np.clip(c, 0, 1)
+
+
+class Rasterizer:
+    """ tiled z-buffer rasterizer for screen space triangles """
+    def __init__(self, width, height, bgColor=BG_COLOR, tile=16):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.color = np.empty((height, width, 3), np.float32)
+        self.color[:] = bgColor[:3]
+        self.depth = np.full((height, width), np.inf, np.float32)
+
+    def bin(self, x, y):
+        """ sort triangles into tiles, returns (triangles, offsets) per tile """
+        tile = self.tile
+        tilesX = (self.width + tile - 1) // tile
+        tilesY = (self.height + tile - 1) // tile
+        tx0 = np.clip(np.floor(x.min(axis=1)), 0, self.width - 1).astype(np.int64) // tile
+        tx1 = np.clip(np.ceil(x.max(axis=1)), 0, self.width - 1).astype(np.int64) // tile
+        ty0 = np.clip(np.floor(y.min(axis=1)), 0, self.height - 1).astype(np.int64) // tile
+        ty1 = np.clip(np.ceil(y.max(axis=1)), 0, self.height - 1).astype(np.int64) // tile
+
+        nx, ny = tx1 - tx0 + 1, ty1 - ty0 + 1
+        counts = nx * ny
+        triangle = np.repeat(np.arange(len(x)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        tileId = (ty0[triangle] + local // nx[triangle]) * tilesX + tx0[triangle] + local % nx[triangle]
+        # stable, so triangles keep their submission order within a tile
+        order = np.argsort(tileId, kind="mergesort")
+        offsets = np.searchsorted(tileId[order], np.arange(tilesX * tilesY + 1))
+        return triangle[order], offsets, tilesX
+
+    def draw(self, x, y, z, w, colors, workers=None):
+        """ x, y, z, w: (n, 3) screen coordinates, depth and clip w per corner;
+        colors: (n, 3, 3) per-corner colors """
+        self.x, self.y, self.z, self.w, self.colors = x, y, z, w, colors
+        self.area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+        triangles, offsets, tilesX = self.bin(x, y)
+
+        jobs = [(i, triangles[offsets[i]:offsets[i + 1]])
+                for i in range(len(offsets) - 1) if offsets[i + 1] > offsets[i]]
+        with ThreadPoolExecutor(workers) as pool:
+            # tiles write disjoint slices of the buffers
+            list(pool.map(lambda job: self.drawTile(job[0] % tilesX, job[0] // tilesX, job[1]), jobs))
+
+    def drawTile(self, tx, ty, triangles):
+        x0, y0 = tx * self.tile, ty * self.tile
+        x1, y1 = min(x0 + self.tile, self.width), min(y0 + self.tile, self.height)
+        py, px = np.mgrid[y0:y1, x0:x1].astype(np.float32) + 0.5
+        px, py = px.ravel(), py.ravel()
+        depth = self.depth[y0:y1, x0:x1].reshape(-1)
+        color = self.color[y0:y1, x0:x1].reshape(-1, 3)
+
+        for start in range(0, len(triangles), CHUNK):
+            t = triangles[start:start + CHUNK]
+            x, y, area = self.x[t], self.y[t], self.area[t][:, None]
+
+            # barycentric coordinates from edge functions, (triangles, pixels)
+            l0 = ((x[:, 2:3] - x[:, 1:2]) * (py - y[:, 1:2]) - (y[:, 2:3] - y[:, 1:2]) * (px - x[:, 1:2])) / area
+            l1 = ((x[:, 0:1] - x[:, 2:3]) * (py - y[:, 2:3]) - (y[:, 0:1] - y[:, 2:3]) * (px - x[:, 2:3])) / area
+            l2 = 1 - l0 - l1
+            inside = (l0 >= 0) & (l1 >= 0) & (l2 >= 0)
+
+            z = self.z[t]
+            fragZ = np.where(inside, l0 * z[:, 0:1] + l1 * z[:, 1:2] + l2 * z[:, 2:3], np.inf)
+            best = np.argmin(fragZ, axis=0)
+            pixels = np.arange(len(px))
+            bestZ = fragZ[best, pixels]
+            closer = np.flatnonzero(bestZ < depth)
+            if not len(closer):
+                continue
+
+            # perspective correct color interpolation
+            tri = best[closer]
+            w = self.w[t[tri]]
+            b = np.stack([l0[tri, closer], l1[tri, closer], l2[tri, closer]], axis=1) / w
+            b /= b.sum(axis=1, keepdims=True)
+            depth[closer] = bestZ[closer]
+            color[closer] = np.einsum("pk,pkc->pc", b, self.colors[t[tri]])
+
+        self.depth[y0:y1, x0:x1] = depth.reshape(y1 - y0, x1 - x0)
+        self.color[y0:y1, x0:x1] = color.reshape(y1 - y0, x1 - x0, 3)
+
+    def image(self):
+        return (self.color * 255 + 0.5).astype(np.uint8)
+
+
+def render(points, normals, view, width, height, ortho=False, color=COLOR, bgColor=BG_COLOR,
+           tile=16, workers=None):
+    """ render the de-indexed triangle list, returns (image, triangles drawn) """
+    points = np.asarray(points, np.float32).reshape(-1, 3)
+    normals = np.asarray(normals, np.float32).reshape(-1, 3)
+
+    # all vertices in one batched transform
+    modelview = camera.modelview(view)
+    projection = camera.projection(width, height, ortho)
+    homogeneous = np.hstack([points, np.ones((len(points), 1), np.float32)])
+    eye = homogeneous @ modelview.T.astype(np.float32)
+    clip = eye @ projection.T.astype(np.float32)
+
+    # lighting in eye space, normalized like GL_NORMALIZE does
+    eyeNormals = normals @ np.linalg.inv(modelview[:3, :3]).astype(np.float32)
+    eyeNormals /= np.maximum(np.linalg.norm(eyeNormals, axis=1, keepdims=True), 1e-12)
+    colors = shade(eyeNormals, color)
+    # GL_FOG is enabled with its defaults: exponential, density 1, black
+    colors *= np.exp(-np.abs(eye[:, 2]))[:, None]
+
+    # drop triangles that are not completely between the near and far plane
+    clip = clip.reshape(-1, 3, 4)
+    w = clip[:, :, 3]
+    visible = np.all((w > 1e-6) & (np.abs(clip[:, :, 2]) <= w), axis=1)
+    clip, w, colors = clip[visible], w[visible], colors.reshape(-1, 3, 3)[visible]
+
+    x = (clip[:, :, 0] / w + 1) * 0.5 * width
+    y = (1 - clip[:, :, 1] / w) * 0.5 * height
+    z = clip[:, :, 2] / w
+    onScreen = ((x.max(axis=1) >= 0) & (x.min(axis=1) < width) &
+                (y.max(axis=1) >= 0) & (y.min(axis=1) < height))
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+    keep = onScreen & (np.abs(area) > 1e-12)
+
+    raster = Rasterizer(width, height, bgColor, tile)
+    raster.draw(x[keep], y[keep], z[keep], w[keep], colors[keep], workers)
+    return raster.image(), int(keep.sum())
+
+
+def benchmark_gl(points, normals, data, width, height, frames):
+    """ triangles per second of the headless GL path for the same mesh """
+    if not os.environ.get("DISPLAY"):
+        os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    import glfw
+    from OpenGL.GL import glClear, glFinish, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT
+    from RenderWindow import RenderWindow
+    from export import Offscreen
+
+    rw = RenderWindow(points, normals, data, visible=False, size=(width, height))
+    try:
+        target = Offscreen(width, height)
+        target.bind()
+        start = time.perf_counter()
+        for _ in range(frames):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            rw.scene.render()
+        glFinish()
+        elapsed = time.perf_counter() - start
+        target.unbind()
+        target.delete()
+    finally:
+        glfw.terminate()
+    return len(points) // 3 * frames / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__))
+    parser.add_argument("model", help="object file (.obj, .ply, .stl or cached .npz)")
+    parser.add_argument("--out", default="preview.png", help="output image")
+    parser.add_argument("--size", type=int, default=512, help="image width and height")
+    parser.add_argument("--ortho", action="store_true", help="orthographic instead of perspective")
+    # every triangle of a tile is tested against every pixel of it, so small
+    # tiles win for meshes with many small triangles
+    parser.add_argument("--tile", type=int, default=16, help="tile size in pixels")
+    parser.add_argument("--workers", type=int, help="rasterizer threads")
+    parser.add_argument("--frames", type=int, default=3, help="frames rendered for the timing")
+    parser.add_argument("--compare-gl", action="store_true", help="also time the headless GL path")
+    args = parser.parse_args()
+
+    points, normals, data = load_model(args.model)
+    view = camera.View.fit(points)
+
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        image, drawn = render(points, normals, view, args.size, args.size, args.ortho,
+                              tile=args.tile, workers=args.workers)
+    elapsed = (time.perf_counter() - start) / args.frames
+    write_png(args.out, image)
+
+    triangles = len(points) // 3
+    print("software: %d triangles (%d on screen) in %.1f ms, %.0f tris/s"
+          % (triangles, drawn, elapsed * 1000, triangles / elapsed))
+    if args.compare_gl:
+        rate = benchmark_gl(points, normals, data, args.size, args.size, max(args.frames, 10))
+        print("headless GL: %.0f tris/s (%.1fx software)" % (rate, rate * elapsed / triangles))
+
+
+if __name__ == '__main__':
+    main()
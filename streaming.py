@@ -0,0 +1,173 @@
+"""
+/**         streaming.py
+ *
+ *          Per-frame vertex streaming for deforming meshes. Interleaved
+ *          vertex/normal data (the layout of Scene.uni_vbo) is written into
+ *          one of three ranges of a stream buffer while the GPU still reads
+ *          the others. With GL_ARB_buffer_storage the buffer stays persistently
+ *          mapped and fences guard each range; otherwise ranges are written
+ *          unsynchronized and the buffer is orphaned on every wrap around.
+ ****
+"""
+
+import time, ctypes
+
+from OpenGL.GL import glBindBuffer, glBufferData, glBufferStorage, glClear, \
+    glClientWaitSync, glDeleteBuffers, glDeleteSync, glFenceSync, glFinish, glGenBuffers, \
+    glMapBufferRange, glUnmapBuffer, GL_ARRAY_BUFFER, GL_COLOR_BUFFER_BIT, \
+    GL_DEPTH_BUFFER_BIT, GL_MAP_COHERENT_BIT, GL_MAP_INVALIDATE_RANGE_BIT, \
+    GL_MAP_PERSISTENT_BIT, GL_MAP_UNSYNCHRONIZED_BIT, GL_MAP_WRITE_BIT, GL_STREAM_DRAW, \
+    GL_SYNC_GPU_COMMANDS_COMPLETE, GL_TIMEOUT_EXPIRED
+
+import numpy as np
+
+
+class VertexStream:
+    """ triple-buffered ranges of interleaved vertex/normal data """
+    def __init__(self, vertexCount, regions=3, persistent=None):
+        self.vertexCount = vertexCount
+        self.regions = regions
+        self.regionSize = vertexCount * 24
+        self.total = self.regionSize * regions
+        if persistent is None:
+            persistent = bool(glBufferStorage) and bool(glFenceSync)
+        self.persistent = persistent
+
+        self.buffer = int(glGenBuffers(1))
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        if persistent:
+            flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+            glBufferStorage(GL_ARRAY_BUFFER, self.total, None, flags)
+            ptr = glMapBufferRange(GL_ARRAY_BUFFER, 0, self.total, flags)
+            ptr = getattr(ptr, "value", ptr)
+            buf = (ctypes.c_ubyte * self.total).from_address(ptr)
+            self.mapped = np.frombuffer(buf, np.float32).reshape(regions, 2 * vertexCount, 3)
+        else:
+            glBufferData(GL_ARRAY_BUFFER, self.total, None, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.fences = [None] * regions
+        self.region = 0
+        self.written = 0
+        self.dropped = 0
+
+    def update(self, data):
+        """ write the next frame, returns False if the range was still busy """
+        data = np.ascontiguousarray(data, np.float32)
+        if data.size != self.vertexCount * 6:
+            raise ValueError("stream expects %d vertices, got %d" % (self.vertexCount, data.size // 6))
+        region = (self.region + 1) % self.regions
+
+        if self.persistent:
+            fence = self.fences[region]
+            if fence is not None:
+                # poll only: a busy range drops this frame instead of waiting
+                if glClientWaitSync(fence, 0, 0) == GL_TIMEOUT_EXPIRED:
+                    self.dropped += 1
+                    return False
+                glDeleteSync(fence)
+                self.fences[region] = None
+            self.mapped[region] = data.reshape(-1, 3)
+        else:
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+            if region == 0:
+                # orphan: the driver hands out fresh storage, the old one lives
+                # on until the GPU is done with it
+                glBufferData(GL_ARRAY_BUFFER, self.total, None, GL_STREAM_DRAW)
+            flags = GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_RANGE_BIT | GL_MAP_UNSYNCHRONIZED_BIT
+            ptr = glMapBufferRange(GL_ARRAY_BUFFER, region * self.regionSize, self.regionSize, flags)
+            ctypes.memmove(getattr(ptr, "value", ptr), data.ctypes.data, self.regionSize)
+            glUnmapBuffer(GL_ARRAY_BUFFER)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.region = region
+        self.written += self.vertexCount
+        return True
+
+    def bind(self):
+        """ bind the current range, returns the vertex and normal pointers """
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        offset = self.region * self.regionSize
+        return ctypes.c_void_p(offset), ctypes.c_void_p(offset + 12)
+
+    def unbind(self):
+        """ called after the draws that read the current range """
+        if self.persistent:
+            if self.fences[self.region] is not None:
+                glDeleteSync(self.fences[self.region])
+            self.fences[self.region] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        for fence in self.fences:
+            if fence is not None:
+                glDeleteSync(fence)
+        if self.persistent:
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+            glUnmapBuffer(GL_ARRAY_BUFFER)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDeleteBuffers(1, [self.buffer])
+
+
+class MorphAnimation:
+    """ loops through frames of interleaved data, blending neighbouring frames """
+    def __init__(self, frames, fps=10.):
+        self.frames = [np.asarray(f, np.float32).reshape(-1, 3) for f in frames]
+        if any(len(f) != len(self.frames[0]) for f in self.frames):
+            raise ValueError("all frames of a sequence need the same vertex count")
+        self.fps = fps
+
+    def frame(self, t):
+        s = t * self.fps
+        i = int(s) % len(self.frames)
+        f = s - int(s)
+        a, b = self.frames[i], self.frames[(i + 1) % len(self.frames)]
+        # normals are blended too, GL_NORMALIZE takes care of their length
+        return a + (b - a) * f
+
+
+class WaveAnimation:
+    """ synthetic deformation: vertices move along their normals """
+    def __init__(self, points, normals, amplitude=0.02, frequency=8.):
+        self.points = np.asarray(points, np.float32)
+        self.normals = np.asarray(normals, np.float32)
+        extent = np.ptp(self.points, axis=0).max()
+        self.amplitude = amplitude * extent
+        self.phase = self.points[:, 1] * frequency / extent
+        self.data = np.empty((len(self.points), 2, 3), np.float32)
+        self.data[:, 1] = self.normals
+
+    def frame(self, t):
+        offset = self.amplitude * np.sin(self.phase + 4. * t)
+        self.data[:, 0] = self.points + self.normals * offset[:, None]
+        return self.data.reshape(-1, 3)
+
+
+def benchmark(window, animation, frames=300):
+    """ stream and draw frames as fast as possible, report vertices per second """
+    from export import Offscreen
+
+    scene = window.scene
+    target = Offscreen(window.width, window.height)
+    target.bind()
+    updateTime = 0.
+    start = time.perf_counter()
+    for i in range(frames):
+        data = animation.frame(i / 60.)
+        t = time.perf_counter()
+        scene.stream.update(data)
+        updateTime += time.perf_counter() - t
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        scene.render()
+    glFinish()
+    elapsed = time.perf_counter() - start
+    target.unbind()
+    target.delete()
+
+    stream = scene.stream
+    mode = "persistent" if stream.persistent else "orphaning"
+    print("streamed %d frames of %d vertices (%s): %.1f fps, %.2fM vertices/s, "
+          "%.2fM vertices/s upload only, %d frames dropped"
+          % (frames, stream.vertexCount, mode, frames / elapsed, stream.written / elapsed / 1e6,
+             stream.written / max(updateTime, 1e-9) / 1e6, stream.dropped))
+    return stream.written / elapsed